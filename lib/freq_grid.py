@@ -0,0 +1,90 @@
+from typing import Callable
+
+import numpy as np
+
+# intervals narrower than this (in decades) are never bisected, so that
+# the refinement does not chase the noise of the simulated PSD
+__MIN_LOG_WIDTH = 1e-3
+
+
+def get_adaptive_freqs(
+    get_psd: Callable[[np.ndarray], np.ndarray],
+    min_freq: float,
+    max_freq: float,
+    max_points: int,
+    n_initial: int = 17,
+    slope_tolerance: float = 0.1,
+    get_theory_psd: Callable[[np.ndarray], np.ndarray] | None = None,
+    theory_tolerance: float = 0.1,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Build frequency grid which is denser where the PSD is more intricate.
+
+    Input:
+        get_psd:
+            Function which evaluates the PSD at the given frequencies.
+            It is called once per refinement round with the new
+            frequencies only.
+        min_freq:
+            Minimum frequency of the grid.
+        max_freq:
+            Maximum frequency of the grid. Bounds are swapped if
+            it is smaller than `min_freq`.
+        max_points:
+            Maximum number of frequencies in the grid.
+        n_initial: (default: 17)
+            Number of log-spaced frequencies in the initial grid.
+            Reduced to `max_points` if it is larger.
+        slope_tolerance: (default: 0.1)
+            Intervals adjacent to points at which the log-log slope
+            of the PSD changes by more than this are bisected.
+        get_theory_psd: (default: None)
+            Function which evaluates the theoretical PSD at the given
+            frequencies. If passed, then intervals in which the PSD
+            deviates from the theory by more than `theory_tolerance`
+            (in decades) are bisected as well.
+        theory_tolerance: (default: 0.1)
+            Allowed deviation from the theoretical PSD in decades.
+
+    Output:
+        Tuple of the sorted frequencies and the PSD at them.
+
+    Note: In each round the intervals are bisected (in the logarithmic
+        scale) in the order of decreasing excess over the tolerances,
+        until the point budget is exhausted or no interval exceeds the
+        tolerances.
+    """
+    # the range may be passed in either order
+    min_freq, max_freq = min(min_freq, max_freq), max(min_freq, max_freq)
+    n_initial = min(n_initial, max_points)
+    freqs = np.logspace(np.log10(min_freq), np.log10(max_freq), n_initial)
+    psd = get_psd(freqs)
+    while len(freqs) < max_points:
+        log_freqs = np.log10(freqs)
+        log_psd = np.log10(psd)
+
+        # excess of the slope change at the interior points, shared by the
+        # two intervals adjacent to each point
+        slopes = np.diff(log_psd) / np.diff(log_freqs)
+        point_excess = np.zeros(len(freqs))
+        point_excess[1:-1] = np.abs(np.diff(slopes)) / slope_tolerance
+        if get_theory_psd is not None:
+            deviation = np.abs(log_psd - np.log10(get_theory_psd(freqs)))
+            point_excess = np.maximum(point_excess, deviation / theory_tolerance)
+        excess = np.maximum(point_excess[:-1], point_excess[1:])
+        excess[np.diff(log_freqs) < 2 * __MIN_LOG_WIDTH] = 0
+
+        candidates = np.flatnonzero(excess > 1)
+        if len(candidates) == 0:
+            break
+        order = np.argsort(-excess[candidates], kind="stable")
+        selected = np.sort(candidates[order[: max_points - len(freqs)]])
+
+        new_freqs = 10 ** ((log_freqs[selected] + log_freqs[selected + 1]) / 2)
+        new_psd = get_psd(new_freqs)
+
+        freqs = np.concatenate((freqs, new_freqs))
+        psd = np.concatenate((psd, new_psd))
+        order = np.argsort(freqs)
+        freqs = freqs[order]
+        psd = psd[order]
+    return freqs, psd
@@ -0,0 +1,295 @@
+import numpy as np
+
+# oversampling factors of the spatial grid (on which the weights are spread)
+# and of the spectral grid (from which the sums are interpolated)
+__SPATIAL_OVERSAMPLING = 2
+__SPECTRAL_OVERSAMPLING = 2
+
+# frequency bands containing fewer frequencies than this are evaluated
+# directly, because spreading and interpolation would cost more
+__MIN_BAND_SIZE = 8
+
+
+def nufft3(
+    x: np.ndarray,
+    weights: np.ndarray,
+    s: np.ndarray,
+    tolerance: float = 1e-9,
+    grid_limit: int = -1,
+) -> np.ndarray:
+    """Evaluate exponential sums at arbitrary points (type-3 NUFFT).
+
+    Input:
+        x:
+            Locations of the sources (e.g., event times).
+        weights:
+            Complex (or real) weights of the sources.
+        s:
+            Points (e.g., angular frequencies) at which the sums are
+            evaluated.
+        tolerance: (default: 1e-9)
+            Desired accuracy of the sums relative to the sum of the
+            absolute values of the weights.
+        grid_limit: (default: -1)
+            Maximum size of the uniform grids used within a single
+            frequency band. If negative value is passed (which is the
+            default), then the limit is set to be proportional to the
+            number of sources.
+
+    Output:
+        Sums of `weights * exp(-1j * s_k * x)` for each of `s_k`.
+
+    Note: Computational cost of the type-3 NUFFT is determined by the
+        product of the spread of `x` and the spread of `s`. Therefore `s`
+        is split into bands small enough for the grids to fit into
+        `grid_limit`. Bands with only a few points (typically the highest
+        frequencies on a logarithmic grid) are evaluated directly.
+    """
+    x = np.asarray(x, dtype=float)
+    weights = np.asarray(weights, dtype=complex)
+    s = np.asarray(s, dtype=float)
+
+    if grid_limit < 0:
+        grid_limit = max(2**16, 4 * len(x))
+
+    x_center = (np.max(x) + np.min(x)) / 2
+    x_half_width = (np.max(x) - np.min(x)) / 2
+    if x_half_width == 0:
+        return __direct_sums(x, weights, s)
+
+    log_tolerance = np.log(1 / tolerance)
+    spread_width = int(np.ceil(np.sqrt(2) * log_tolerance / np.pi)) + 1
+    max_half_band = (
+        np.pi
+        * ((grid_limit - 1) // 2 - spread_width - 1)
+        / (__SPATIAL_OVERSAMPLING * x_half_width)
+    )
+
+    order = np.argsort(s)
+    sorted_s = s[order]
+    sums = np.empty(len(s), dtype=complex)
+    band_from = 0
+    while band_from < len(s):
+        band_to = int(
+            np.searchsorted(
+                sorted_s, sorted_s[band_from] + 2 * max_half_band, side="right"
+            )
+        )
+        band_to = max(band_to, band_from + 1)
+        band = order[band_from:band_to]
+        if band_to - band_from < __MIN_BAND_SIZE:
+            sums[band] = __direct_sums(x, weights, s[band])
+        else:
+            sums[band] = __nufft3_band(
+                x - x_center,
+                weights,
+                s[band],
+                x_half_width,
+                log_tolerance,
+                spread_width,
+            ) * np.exp(-1j * s[band] * x_center)
+        band_from = band_to
+    return sums
+
+
+def __direct_sums(
+    x: np.ndarray,
+    weights: np.ndarray,
+    s: np.ndarray,
+) -> np.ndarray:
+    """Evaluate exponential sums directly.
+
+    Input:
+        x:
+            Locations of the sources.
+        weights:
+            Weights of the sources.
+        s:
+            Points at which the sums are evaluated.
+
+    Output:
+        Sums of `weights * exp(-1j * s_k * x)` for each of `s_k`.
+    """
+    return np.array([np.sum(weights * np.exp(-1j * s_k * x)) for s_k in s])
+
+
+def __nufft3_band(
+    x: np.ndarray,
+    weights: np.ndarray,
+    s: np.ndarray,
+    x_half_width: float,
+    log_tolerance: float,
+    spread_width: int,
+) -> np.ndarray:
+    """Evaluate exponential sums for a single band of points.
+
+    Input:
+        x:
+            Centered locations of the sources, `|x| <= x_half_width`.
+        weights:
+            Weights of the sources.
+        s:
+            Points at which the sums are evaluated.
+        x_half_width:
+            Half-width of the interval containing the sources.
+        log_tolerance:
+            Logarithm of the inverse of the desired accuracy.
+        spread_width:
+            Number of spatial grid points (on each side) to which
+            a single source is spread.
+
+    Output:
+        Sums of `weights * exp(-1j * s_k * x)` for each of `s_k`.
+
+    Note: The weights are convolved with a Gaussian and sampled on
+        a uniform grid. Fourier transform of the sampled function at
+        arbitrary points is then evaluated by the type-2 NUFFT, and
+        the effect of the Gaussian is divided out.
+    """
+    s_center = (np.max(s) + np.min(s)) / 2
+    s_half_width = max(
+        (np.max(s) - np.min(s)) / 2,
+        np.pi / (__SPATIAL_OVERSAMPLING * x_half_width),
+    )
+    centered_s = s - s_center
+
+    # spatial grid and Gaussian kernel: aliased images of the kernel's
+    # spectrum and the truncated tails are both below the tolerance
+    step = np.pi / (__SPATIAL_OVERSAMPLING * s_half_width)
+    tau = log_tolerance / (
+        ((2 * __SPATIAL_OVERSAMPLING - 1) ** 2 - 1) * s_half_width**2
+    )
+    half_grid = int(np.ceil(x_half_width / step)) + spread_width + 1
+
+    # shift the band to the origin
+    shifted_weights = weights * np.exp(-1j * s_center * x)
+
+    grid = __spread(x, shifted_weights, step, tau, half_grid, spread_width)
+    fourier = step * __nufft2(grid, centered_s * step, log_tolerance)
+
+    kernel_fourier = np.sqrt(4 * np.pi * tau) * np.exp(-tau * centered_s**2)
+    return fourier / kernel_fourier
+
+
+def __spread(
+    x: np.ndarray,
+    weights: np.ndarray,
+    step: float,
+    tau: float,
+    half_grid: int,
+    spread_width: int,
+) -> np.ndarray:
+    """Spread weighted sources onto a uniform grid with a Gaussian kernel.
+
+    Input:
+        x:
+            Locations of the sources.
+        weights:
+            Weights of the sources.
+        step:
+            Step of the uniform grid.
+        tau:
+            Width parameter of the Gaussian `exp(-x**2 / (4 * tau))`.
+        half_grid:
+            Grid covers points from `-half_grid * step` to
+            `half_grid * step`.
+        spread_width:
+            Number of grid points (on each side) to which a single
+            source is spread.
+
+    Output:
+        Values of the convolution on the grid.
+
+    Note: The Gaussian is factorized as in the fast Gaussian gridding, so
+        only two exponentials per source need to be evaluated.
+    """
+    n_grid = 2 * half_grid + 1
+    nearest = np.rint(x / step).astype(np.int64)
+    offsets = x - nearest * step
+    index = nearest + half_grid
+
+    central = weights * np.exp(-(offsets**2) / (4 * tau))
+    ratio = np.exp(offsets * step / (2 * tau))
+    inverse_ratio = 1 / ratio
+
+    grid = np.zeros(n_grid, dtype=complex)
+    right = central.copy()
+    left = central.copy()
+    for k in range(spread_width + 1):
+        decay = np.exp(-((k * step) ** 2) / (4 * tau))
+        if k > 0:
+            right *= ratio
+            left *= inverse_ratio
+            grid += decay * __bincount(index - k, left, n_grid)
+        grid += decay * __bincount(index + k, right, n_grid)
+    return grid
+
+
+def __bincount(
+    index: np.ndarray,
+    weights: np.ndarray,
+    length: int,
+) -> np.ndarray:
+    """Sum complex weights falling into the same bin.
+
+    Input:
+        index:
+            Bin of each weight.
+        weights:
+            Complex weights.
+        length:
+            Number of bins.
+
+    Output:
+        Complex sums for each bin.
+    """
+    return np.bincount(index, weights=weights.real, minlength=length) + 1j * (
+        np.bincount(index, weights=weights.imag, minlength=length)
+    )
+
+
+def __nufft2(
+    coefficients: np.ndarray,
+    theta: np.ndarray,
+    log_tolerance: float,
+) -> np.ndarray:
+    """Evaluate a trigonometric polynomial at arbitrary points (type-2 NUFFT).
+
+    Input:
+        coefficients:
+            Coefficients `c_m` of the polynomial, for `m` ranging
+            symmetrically from `-(len(coefficients) // 2)`.
+        theta:
+            Points at which to evaluate the polynomial.
+        log_tolerance:
+            Logarithm of the inverse of the desired accuracy.
+
+    Output:
+        Sums of `c_m * exp(-1j * m * theta_k)` for each of `theta_k`.
+    """
+    n_modes = len(coefficients)
+    half_modes = n_modes // 2
+    modes = np.arange(-half_modes, n_modes - half_modes)
+
+    n_grid = int(2 ** np.ceil(np.log2(__SPECTRAL_OVERSAMPLING * n_modes)))
+    ratio = n_grid / n_modes
+    spread_width = int(np.ceil(1.5 * log_tolerance / np.pi)) + 1
+    tau = np.pi * spread_width / ((n_modes**2) * ratio * (ratio - 0.5))
+
+    # precompensate for the Gaussian interpolation and go to the
+    # oversampled uniform grid
+    padded = np.zeros(n_grid, dtype=complex)
+    padded[modes % n_grid] = (
+        coefficients * np.exp(tau * modes**2) * 2 * np.pi / np.sqrt(4 * np.pi * tau)
+    )
+    transformed = np.fft.fft(padded)
+
+    # interpolate from the uniform grid
+    nearest = np.rint(theta * n_grid / (2 * np.pi)).astype(np.int64)
+    result = np.zeros(len(theta), dtype=complex)
+    for k in range(-spread_width, spread_width + 1):
+        offsets = theta - 2 * np.pi * (nearest + k) / n_grid
+        result += transformed[(nearest + k) % n_grid] * np.exp(
+            -(offsets**2) / (4 * tau)
+        )
+    return result / n_grid
@@ -7,6 +7,8 @@ def sample(
     high: float = 1000,
     size: int | tuple = 1,
     rng: np.random.Generator | None = None,
+    out: np.ndarray | None = None,
+    dtype: type = np.float64,
 ) -> np.ndarray:
     """Sample from the (un)bounded Pareto distribution.
 
@@ -19,34 +21,87 @@ def sample(
         high: (default: 1000)
             Location of the upper truncation.
         size: (default: 1)
-            Size of the desired sample.
+            Size of the desired sample. Either an integer or a tuple
+            describing the shape of the output array.
         rng: (default: None)
             Numpy RNG object. If not specified, then a default RNG
             instance will be created within this function.
+        out: (default: None)
+            Preallocated array to fill with the sample. If specified,
+            then `size` and `dtype` are ignored and the shape and
+            the type of `out` are used instead.
+        dtype: (default: np.float64)
+            Floating point type of the sample, either `np.float64` or
+            `np.float32`. Note that single precision uniform variates
+            are drawn differently, so the sample differs from the
+            double precision one even for the same seed.
 
     Output:
         Samples arranged into Numpy array of predetermined size, or
         singular real value.
+
+    Note: Bounded samples are obtained by the inverse CDF method. Uniform
+        variates are drawn from `rng` in a single batch, which consumes the
+        RNG stream in exactly the same order as drawing them one by one.
+        Hence for the same seed scalar and vectorized calls yield the same
+        sample.
     """
     if rng is None:
         rng = np.random.default_rng()
 
+    if out is not None:
+        size = out.shape
+        dtype = out.dtype.type
+
     if high == np.inf:
         if size == 1:
-            return np.array((rng.pareto(power) + 1) * low)
-        else:
-            return (rng.pareto(power, size=size) + 1) * low
+            return np.array((rng.pareto(power) + 1) * low, dtype=dtype)
+        if out is None:
+            return ((rng.pareto(power, size=size) + 1) * low).astype(dtype)
+        np.add(rng.pareto(power, size=size), 1, out=out, casting="same_kind")
+        return np.multiply(out, low, out=out)
+
+    scale = high / low
 
     if size == 1:
-        scale = high / low
-        u = rng.random()
-        result = (1 - u + u / (scale**power)) ** (-1 / power)
-        result = result * low
-    else:
-        n_elems = int(np.prod(size))
-        result = np.array(
-            [sample(power, low=low, high=high, size=1, rng=rng) for _ in range(n_elems)]
-        )
-        result.shape = size
-
-    return result
+        u = np.array([rng.random(dtype=dtype)], dtype=dtype)
+        return __inverse_cdf(u, power, low, scale, u)[0]
+
+    if out is None:
+        out = np.empty(size, dtype=dtype)
+    rng.random(dtype=dtype, out=out)
+    return __inverse_cdf(out, power, low, scale, out)
+
+
+def __inverse_cdf(
+    u: np.ndarray,
+    power: float,
+    low: float,
+    scale: float,
+    out: np.ndarray,
+) -> np.ndarray:
+    """Transform uniform variates into bounded Pareto variates.
+
+    Input:
+        u:
+            Uniform variates from the unit interval.
+        power:
+            Power law exponent parameter.
+        low:
+            Location of the lower truncation.
+        scale:
+            Ratio between the upper and the lower truncation.
+        out:
+            Array into which to write the result. May be the same
+            array as `u`.
+
+    Output:
+        Bounded Pareto variates (the `out` array).
+    """
+    # keep the order of operations of `(1 - u + u / scale**power)` so that
+    # any sample size produces the same values
+    scaled_u = u / (scale**power)
+    np.subtract(1, u, out=out)
+    np.add(out, scaled_u, out=out)
+    np.power(out, -1 / power, out=out)
+    return np.multiply(out, low, out=out)
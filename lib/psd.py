@@ -1,12 +1,59 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Iterable
+
 import numpy as np
 
+from lib.nufft import nufft3
+from lib.psd_numba import get_fused_edge_sums
+from lib.shared import SharedArrayHandle, attach_arrays, share_arrays
+from lib.theory_psd import get_high_freq_tail_psd
+
+# number of bytes of working memory needed per (frequency, event) pair by the
+# tiled kernel: one real phase buffer and two complex buffers
+__TILE_BYTES_PER_ELEMENT = 40
+
+# largest value of `w * T / 2` for which the low frequency expansion is used,
+# larger values would require many terms and suffer from cancellation
+__MOMENT_MAX_ARGUMENT = np.pi
+
+# maximum number of pulse (and gap) durations from which the characteristic
+# functions are estimated when checking for the high frequency asymptote
+__TAIL_SAMPLE_SIZE = 2**14
+
+# durations taking at most this many distinct values are grouped by the
+# "grouped" method, otherwise it falls back to "edges"
+__MAX_DURATION_GROUPS = 64
+
+# ratio between the number of bins of the fine time grid and the highest
+# harmonic evaluated by the "natural" method
+__NATURAL_OVERSAMPLING = 8
+
+# frequencies within this many units in the last place (of the number of
+# lattice points) from a harmonic are evaluated by the FFT of the lattice
+__LATTICE_HARMONIC_ULPS = 16
+
 
 def get_snorp_psd(
     freqs: np.ndarray,
     pulse_durations: np.ndarray,
     gap_durations: np.ndarray,
     pulse_magnitude: float = 1,
-) -> np.ndarray:
+    method: str = "direct",
+    memory_limit: int = 2**22,
+    tolerance: float = 1e-9,
+    anchor_every: int = 64,
+    grid_limit: int = 2**24,
+    precision: str = "float64",
+    lattice_step: float = 1,
+    low_freq_moments: bool = False,
+    tail_tolerance: float = -1,
+    return_asymptotic: bool = False,
+    return_fourier: bool = False,
+    n_threads: int = 1,
+    workspace: "RectWorkspace | None" = None,
+) -> np.ndarray | tuple[np.ndarray, np.ndarray]:
     """Calculate PSD of the signal with non-overlapping rectangular pulses.
 
     Input:
@@ -15,55 +62,961 @@ def get_snorp_psd(
             of the PSD.
         pulse_durations:
             List containing durations of each pulse in
-            the signal.
+            the signal. Two dimensional array of shape
+            `(repeats, n_events)` is treated as a batch of
+            independent realizations. Realizations with fewer
+            events may be padded with zero durations, which
+            do not change their PSD (see `stack_durations`).
         gap_durations:
             List containing durations of each interpulse
-            gap in the signal
+            gap in the signal. Has to have the same shape as
+            `pulse_durations`.
         pulse_magnitude: (default: 1)
             Fixed magnitude of the pulses in the signal.
+        method: (default: "direct")
+            Method used to evaluate the Fourier transform. "direct"
+            loops over the frequencies and evaluates the sums over
+            all events for each of them. "tiled" splits the work
+            into blocks of frequencies and events, which are
+            evaluated in a vectorized manner. "edges" evaluates
+            the sums over the transitions between pulses and
+            gaps, which requires half as many exponentials.
+            "nufft" uses the non-uniform fast Fourier transform
+            over the transitions. "numba" evaluates the same sums
+            as "edges" in a compiled loop, which runs in parallel
+            over the frequencies (falls back to "edges" if numba
+            is not installed). "recurrence" evaluates the same
+            sums as "edges", but on evenly spaced stretches of
+            the frequency grid obtains the exponentials for the
+            next frequency by multiplying those for the previous
+            one. "natural" evaluates the sums at the natural
+            frequencies (integer multiples of the inverse of the
+            signal duration) by binning the transitions onto a
+            fine time grid and applying the real FFT, the other
+            frequencies are handled as by "recurrence". "grouped"
+            factors out the terms depending on the pulse (or gap)
+            durations if they take only a few distinct values
+            (e.g., fixed pulse durations), so that only a single
+            exponential per event is needed (falls back to "edges"
+            if both take many values). "lattice" requires all
+            durations to be integer multiples of `lattice_step`
+            (see `snap_to_lattice`), then the sums at the natural
+            frequencies are exactly obtained by a single real FFT
+            of the transitions binned onto the lattice, and the
+            other frequencies are summed over the occupied
+            lattice points only.
+        memory_limit: (default: 2**22)
+            Approximate upper limit (in bytes) of the working
+            memory used by the "tiled" method. Split among the
+            threads if `n_threads > 1`.
+        tolerance: (default: 1e-9)
+            Desired accuracy of the "nufft" and "natural"
+            methods and of the low frequency expansion. Accuracy
+            is relative to the sum of absolute pulse and gap
+            magnitudes over all events.
+        anchor_every: (default: 64)
+            Number of frequencies after which the "recurrence"
+            method evaluates the exponentials anew to prevent
+            accumulation of rounding errors.
+        grid_limit: (default: 2**24)
+            Maximum number of bins of the fine time grid used by
+            the "natural" method. Natural frequencies above
+            `grid_limit / 8` harmonic are handled as by
+            "recurrence". Also the maximum size of the FFT used by
+            the "lattice" method.
+        precision: (default: "float64")
+            Precision of the per-event terms. If "float32" is
+            passed, then phases are reduced to a single cycle in
+            double precision, trigonometric functions are
+            evaluated in single precision and summed in double
+            precision. Supported only by the "edges" method. Use
+            `get_precision_deviation` to check whether single
+            precision is accurate enough.
+        lattice_step: (default: 1)
+            Spacing of the lattice on which the transitions lie,
+            used by the "lattice" method.
+        low_freq_moments: (default: False)
+            If True, then frequencies for which the signal spans
+            at most a single period (`f * T <= 1`) are
+            evaluated from the power series expansion in the
+            transition times. Series is truncated once its
+            remainder is provably below `tolerance`. Supported
+            only by the "edges", "nufft", "recurrence" and
+            "natural" methods.
+        tail_tolerance: (default: -1)
+            If positive value is passed, then frequencies at
+            which the PSD is estimated to be within this
+            relative distance from its `1/f^2` asymptote (see
+            `lib.theory_psd.get_high_freq_tail_psd`) are not
+            summed over, but the asymptote is returned instead.
+            The check is statistical (based on a sample of
+            durations) and assumes that all durations are
+            independent, so it is not reliable for correlated
+            durations. Values below a few percent rarely have
+            any effect.
+        return_asymptotic: (default: False)
+            If True, then boolean array marking the frequencies
+            at which the asymptote was returned is also output.
+        return_fourier: (default: False)
+            If True, then the complex Fourier transform of the
+            signal (with its mean subtracted) is returned instead
+            of the PSD. PSD is equal to `2 / T * abs(fourier)**2`.
+            Can not be combined with the asymptote.
+        n_threads: (default: 1)
+            Number of threads among which the frequencies are
+            split. Supported only by the "direct", "tiled" and
+            "edges" methods.
+            Threads share the event arrays without copying them,
+            and NumPy releases the GIL while working on them.
+        workspace: (default: None)
+            If passed, then the "direct" method evaluates the
+            per-event terms in the buffers of this `RectWorkspace`
+            instead of allocating new arrays for each frequency.
+            Reuse the same workspace across calls to avoid the
+            allocations altogether. Requires a single thread.
 
     Output:
-        An estimate of the PSD at given frequencies.
+        An estimate of the PSD at given frequencies. For a
+        batch of realizations, array of shape
+        `(repeats, len(freqs))`. If `return_asymptotic` is
+        True, then a tuple of the PSD and the mask of
+        asymptotic frequencies.
 
     Note: This function is applicable only when the pulses
         are of rectangular shape and have the same magnitude.
-        By default unit magnitude is assumed.
+        By default unit magnitude is assumed. Batches are
+        evaluated at once by the "direct" and "edges" (in
+        double precision) methods, other methods and options
+        evaluate the realizations one by one.
     """
     angular_freqs = 2 * np.pi * freqs
 
+    if precision not in ("float64", "float32"):
+        raise ValueError(f"Unknown precision: {precision}")
+    if precision == "float32" and method != "edges":
+        raise ValueError("Single precision is supported only by the edges method.")
+    if low_freq_moments and method not in ("edges", "nufft", "recurrence", "natural"):
+        raise ValueError(
+            f"Low frequency moments are not supported by the {method} method."
+        )
+    if n_threads > 1 and method not in ("direct", "tiled", "edges"):
+        raise ValueError(f"Threads are not supported by the {method} method.")
+
+    if return_fourier and (tail_tolerance > 0 or return_asymptotic):
+        raise ValueError("Asymptote does not provide Fourier transform.")
+
+    if workspace is not None and method != "direct":
+        raise ValueError("Workspace is supported only by the direct method.")
+    if workspace is not None and n_threads > 1:
+        raise ValueError("Workspace can not be shared among threads.")
+
+    is_batch = np.ndim(pulse_durations) == 2
+    if is_batch and return_asymptotic:
+        raise ValueError("Asymptotic mask is not available for batches.")
+    if is_batch and (
+        method not in ("direct", "edges")
+        or precision != "float64"
+        or low_freq_moments
+        or tail_tolerance > 0
+    ):
+        return np.array(
+            [
+                get_snorp_psd(
+                    freqs,
+                    realization_pulses,
+                    realization_gaps,
+                    pulse_magnitude=pulse_magnitude,
+                    method=method,
+                    memory_limit=memory_limit,
+                    tolerance=tolerance,
+                    anchor_every=anchor_every,
+                    grid_limit=grid_limit,
+                    precision=precision,
+                    lattice_step=lattice_step,
+                    low_freq_moments=low_freq_moments,
+                    tail_tolerance=tail_tolerance,
+                    return_fourier=return_fourier,
+                    n_threads=n_threads,
+                    workspace=workspace,
+                )
+                for realization_pulses, realization_gaps in zip(
+                    pulse_durations, gap_durations
+                )
+            ]
+        )
+
+    if tail_tolerance > 0 or return_asymptotic:
+        is_asymptotic = np.zeros(len(freqs), dtype=bool)
+        if tail_tolerance > 0:
+            is_asymptotic = __get_asymptotic_mask(
+                freqs, pulse_durations, gap_durations, tail_tolerance
+            )
+        psd = np.empty(len(freqs))
+        psd[is_asymptotic] = get_high_freq_tail_psd(
+            freqs[is_asymptotic],
+            pulse_magnitude,
+            np.mean(pulse_durations),
+            np.mean(gap_durations),
+        )
+        if not np.all(is_asymptotic):
+            psd[~is_asymptotic] = get_snorp_psd(
+                freqs[~is_asymptotic],
+                pulse_durations,
+                gap_durations,
+                pulse_magnitude=pulse_magnitude,
+                method=method,
+                memory_limit=memory_limit,
+                tolerance=tolerance,
+                anchor_every=anchor_every,
+                grid_limit=grid_limit,
+                precision=precision,
+                lattice_step=lattice_step,
+                low_freq_moments=low_freq_moments,
+                n_threads=n_threads,
+                workspace=workspace,
+            )
+        if return_asymptotic:
+            return psd, is_asymptotic
+        return psd
+
+    # without numba fall back to the NumPy implementation of the same sums
+    if method == "numba" and get_fused_edge_sums is None:
+        method = "edges"
+
+    if method == "numba":
+        in_pulse_time = np.sum(pulse_durations)
+        total_duration = in_pulse_time + np.sum(gap_durations)
+        real_sums, imag_sums = get_fused_edge_sums(
+            angular_freqs,
+            np.ascontiguousarray(pulse_durations, dtype=float),
+            np.ascontiguousarray(gap_durations, dtype=float),
+            pulse_magnitude,
+            pulse_magnitude * in_pulse_time / total_duration,
+        )
+        fourier = (-1j / angular_freqs) * (real_sums + 1j * imag_sums)
+        normalization = 2 / total_duration
+        if return_fourier:
+            return fourier
+        return normalization * (np.real(fourier) ** 2 + np.imag(fourier) ** 2)
+
+    if method == "grouped":
+        total_duration = np.sum(pulse_durations) + np.sum(gap_durations)
+        fourier = (-1j / angular_freqs) * __get_grouped_sums(
+            angular_freqs, pulse_durations, gap_durations, pulse_magnitude
+        )
+        normalization = 2 / total_duration
+        if return_fourier:
+            return fourier
+        return normalization * (np.real(fourier) ** 2 + np.imag(fourier) ** 2)
+
+    if method == "lattice":
+        edge_times, edge_jumps = __get_edges(
+            pulse_durations, gap_durations, pulse_magnitude
+        )
+        fourier = (-1j / angular_freqs) * __get_lattice_sums(
+            freqs, edge_times, edge_jumps, lattice_step, grid_limit
+        )
+        normalization = 2 / edge_times[-1]
+        if return_fourier:
+            return fourier
+        return normalization * (np.real(fourier) ** 2 + np.imag(fourier) ** 2)
+
+    if method in ("edges", "nufft", "recurrence", "natural"):
+        edge_times, edge_jumps = __get_edges(
+            pulse_durations, gap_durations, pulse_magnitude
+        )
+        # frequencies with periods long compared to the duration of the
+        # signal are obtained from the moments of the transition times
+        is_low = np.zeros(len(angular_freqs), dtype=bool)
+        if low_freq_moments:
+            is_low = angular_freqs * edge_times[-1] / 2 <= __MOMENT_MAX_ARGUMENT
+        sums = np.empty(edge_times.shape[:-1] + angular_freqs.shape, dtype=complex)
+        if np.any(is_low):
+            sums[..., is_low] = __get_moment_sums(
+                angular_freqs[is_low], edge_times, edge_jumps, tolerance
+            )
+
+        is_high = ~is_low
+        if not np.any(is_high):
+            pass
+        elif method == "edges" and precision == "float32":
+            sums[..., is_high] = __get_threaded(
+                partial(
+                    __get_edge_sums_float32,
+                    edge_times=edge_times,
+                    edge_jumps=edge_jumps,
+                ),
+                freqs[is_high],
+                n_threads,
+            )
+        elif method == "edges":
+            sums[..., is_high] = __get_threaded(
+                partial(__get_edge_sums, edge_times=edge_times, edge_jumps=edge_jumps),
+                angular_freqs[is_high],
+                n_threads,
+            )
+        elif method == "recurrence":
+            sums[..., is_high] = __get_recurrence_sums(
+                angular_freqs[is_high], edge_times, edge_jumps, anchor_every
+            )
+        elif method == "natural":
+            sums[..., is_high] = __get_natural_sums(
+                angular_freqs[is_high],
+                edge_times,
+                edge_jumps,
+                tolerance,
+                grid_limit,
+                anchor_every,
+            )
+        else:
+            sums[..., is_high] = nufft3(
+                edge_times, edge_jumps, angular_freqs[is_high], tolerance=tolerance
+            )
+        fourier = (-1j / angular_freqs) * sums
+        normalization = 2 / edge_times[..., -1:]
+        if return_fourier:
+            return fourier
+        return normalization * (np.real(fourier) ** 2 + np.imag(fourier) ** 2)
+
     # our simplification of the Fourier transform formula requires having not
     # only pulse or gap durations, but also the time moment when the respective
     # pulses or gaps have started
-    pulse_starts = (
-        np.cumsum(pulse_durations) + np.cumsum(gap_durations) - pulse_durations
-    )
-    gap_starts = pulse_starts - gap_durations
+    if workspace is None:
+        pulse_starts = (
+            np.cumsum(pulse_durations, axis=-1)
+            + np.cumsum(gap_durations, axis=-1)
+            - pulse_durations
+        )
+        gap_starts = pulse_starts - gap_durations
+    else:
+        buffers = workspace.get_buffers(np.shape(pulse_durations))
+        pulse_starts, gap_starts = buffers[:2]
+        np.cumsum(pulse_durations, axis=-1, out=pulse_starts)
+        np.cumsum(gap_durations, axis=-1, out=gap_starts)
+        np.add(pulse_starts, gap_starts, out=pulse_starts)
+        np.subtract(pulse_starts, pulse_durations, out=pulse_starts)
+        np.subtract(pulse_starts, gap_durations, out=gap_starts)
 
     # to avoid artificats for the lowest frequences we need to subtact the mean
     # magnitude of the signal from the series prior to applying Fourier
     # transform
-    total_duration = pulse_starts[-1] + pulse_durations[-1]
-    in_pulse_time = np.sum(pulse_durations)
+    total_duration = pulse_starts[..., -1] + pulse_durations[..., -1]
+    in_pulse_time = np.sum(pulse_durations, axis=-1)
     mean_magnitude = pulse_magnitude * in_pulse_time / total_duration
     adjusted_pulse_magnitude = pulse_magnitude - mean_magnitude
     adjusted_gap_magnitude = -mean_magnitude
 
     normalization = 2 / total_duration
 
-    return normalization * np.array(
-        [
-            __get_snorp_psd(
-                omega,
-                pulse_durations,
-                pulse_starts,
-                adjusted_pulse_magnitude,
-                gap_durations,
-                gap_starts,
-                adjusted_gap_magnitude,
+    def get_direct_fourier(chunk: np.ndarray) -> np.ndarray:
+        if workspace is not None:
+            return np.array(
+                [
+                    __get_rect_fourier_inplace(
+                        omega,
+                        adjusted_pulse_magnitude,
+                        pulse_durations,
+                        pulse_starts,
+                        buffers[2:],
+                    )
+                    + __get_rect_fourier_inplace(
+                        omega,
+                        adjusted_gap_magnitude,
+                        gap_durations,
+                        gap_starts,
+                        buffers[2:],
+                    )
+                    for omega in chunk
+                ]
+            )
+        return np.array(
+            [
+                __get_rect_fourier(
+                    omega, adjusted_pulse_magnitude, pulse_durations, pulse_starts
+                )
+                + __get_rect_fourier(
+                    omega, adjusted_gap_magnitude, gap_durations, gap_starts
+                )
+                for omega in chunk
+            ]
+        )
+
+    def get_direct_psd(chunk: np.ndarray) -> np.ndarray:
+        if workspace is not None:
+            fourier = get_direct_fourier(chunk)
+            return np.real(fourier) ** 2 + np.imag(fourier) ** 2
+        return np.array(
+            [
+                __get_snorp_psd(
+                    omega,
+                    pulse_durations,
+                    pulse_starts,
+                    adjusted_pulse_magnitude,
+                    gap_durations,
+                    gap_starts,
+                    adjusted_gap_magnitude,
+                )
+                for omega in chunk
+            ]
+        )
+
+    # threads evaluate their chunks concurrently, so they share the limit
+    chunk_memory_limit = memory_limit // max(1, min(n_threads, len(angular_freqs)))
+
+    def get_tiled_fourier(chunk: np.ndarray) -> np.ndarray:
+        return (1j / chunk) * (
+            adjusted_pulse_magnitude
+            * __get_tiled_rect_sums(
+                chunk, pulse_durations, pulse_starts, chunk_memory_limit
+            )
+            + adjusted_gap_magnitude
+            * __get_tiled_rect_sums(
+                chunk, gap_durations, gap_starts, chunk_memory_limit
+            )
+        )
+
+    # realizations of a batch are along the last axis of the loop output
+    if method == "direct" and return_fourier:
+        fourier = __get_threaded(get_direct_fourier, angular_freqs, n_threads, axis=0)
+        return np.transpose(fourier)
+
+    if method == "direct":
+        psd = __get_threaded(get_direct_psd, angular_freqs, n_threads, axis=0)
+        return np.transpose(normalization * psd)
+
+    if method == "tiled":
+        fourier = __get_threaded(get_tiled_fourier, angular_freqs, n_threads)
+        if return_fourier:
+            return fourier
+        return normalization * (np.real(fourier) ** 2 + np.imag(fourier) ** 2)
+
+    raise ValueError(f"Unknown method: {method}")
+
+
+def stack_durations(
+    durations: Iterable[np.ndarray],
+) -> np.ndarray:
+    """Stack durations of several realizations into a batch.
+
+    Input:
+        durations:
+            Pulse (or gap) durations of each realization. Realizations
+            may have different numbers of events.
+
+    Output:
+        Array of shape `(repeats, n_events)`, where `n_events` is the
+        largest number of events, and shorter realizations are padded
+        with zero durations at the end.
+
+    Note: Zero duration pulses and gaps at the end of the signal add
+        pairs of opposite jumps at the same time, which cancel out, so
+        the padding does not change the PSD.
+    """
+    durations = [np.asarray(realization) for realization in durations]
+    stacked = np.zeros((len(durations), max(len(r) for r in durations)))
+    for idx, realization in enumerate(durations):
+        stacked[idx, : len(realization)] = realization
+    return stacked
+
+
+def snap_to_lattice(
+    pulse_durations: np.ndarray,
+    gap_durations: np.ndarray,
+    lattice_step: float,
+) -> tuple[np.ndarray, np.ndarray, float]:
+    """Move transitions of the signal to the nearest points of a lattice.
+
+    Input:
+        pulse_durations:
+            List containing durations of each pulse in the
+            signal.
+        gap_durations:
+            List containing durations of each interpulse gap
+            in the signal.
+        lattice_step:
+            Spacing of the lattice.
+
+    Output:
+        Pulse and gap durations, which are integer multiples of
+        `lattice_step`, and the largest displacement of a transition.
+
+    Note: Transition times (rather than durations) are rounded, so the
+        displacements do not accumulate and never exceed half of the
+        `lattice_step`. Displacement `e` changes each term of the sums
+        over the transitions by at most `w * e`, thus the Fourier
+        transform changes by at most `e * sum(|jumps|)`. Pulses and gaps
+        shorter than the lattice step may collapse to zero duration.
+    """
+    interleaved_durations = np.empty(2 * len(pulse_durations))
+    interleaved_durations[0::2] = gap_durations
+    interleaved_durations[1::2] = pulse_durations
+    edge_times = np.cumsum(interleaved_durations)
+    edge_ticks = np.rint(edge_times / lattice_step)
+    error = float(np.max(np.abs(edge_ticks * lattice_step - edge_times)))
+
+    snapped_durations = np.diff(edge_ticks, prepend=0) * lattice_step
+    return snapped_durations[1::2], snapped_durations[0::2], error
+
+
+def get_precision_deviation(
+    freqs: np.ndarray,
+    pulse_durations: np.ndarray,
+    gap_durations: np.ndarray,
+    pulse_magnitude: float = 1,
+    precision: str = "float32",
+    n_samples: int = 8,
+) -> float:
+    """Estimate the deviation of reduced precision PSD from the double precision one.
+
+    Input:
+        freqs:
+            Frequencies for which the PSD would be estimated.
+        pulse_durations:
+            List containing durations of each pulse in
+            the signal.
+        gap_durations:
+            List containing durations of each interpulse
+            gap in the signal
+        pulse_magnitude: (default: 1)
+            Fixed magnitude of the pulses in the signal.
+        precision: (default: "float32")
+            Reduced precision to check.
+        n_samples: (default: 8)
+            Number of frequencies (evenly spread over `freqs`) on
+            which to compare the estimates.
+
+    Output:
+        Maximum relative deviation of the reduced precision PSD from
+        the double precision PSD over the sampled frequencies.
+    """
+    sample_idx = np.unique(np.linspace(0, len(freqs) - 1, n_samples).astype(int))
+    sampled_freqs = freqs[sample_idx]
+    reference = get_snorp_psd(
+        sampled_freqs,
+        pulse_durations,
+        gap_durations,
+        pulse_magnitude=pulse_magnitude,
+        method="edges",
+    )
+    reduced = get_snorp_psd(
+        sampled_freqs,
+        pulse_durations,
+        gap_durations,
+        pulse_magnitude=pulse_magnitude,
+        method="edges",
+        precision=precision,
+    )
+    return float(np.max(np.abs(reduced / reference - 1)))
+
+
+def get_snorp_psd_streaming(
+    freqs: np.ndarray,
+    chunks: Iterable[tuple[np.ndarray, np.ndarray]],
+    pulse_magnitude: float = 1,
+) -> np.ndarray:
+    """Calculate PSD of the signal with rectangular pulses chunk by chunk.
+
+    Input:
+        freqs:
+            Frequencies for which to obtain the estimates
+            of the PSD.
+        chunks:
+            Iterable yielding tuples of pulse durations and gap
+            durations. Consecutive chunks are treated as the
+            continuation of the same signal.
+        pulse_magnitude: (default: 1)
+            Fixed magnitude of the pulses in the signal.
+
+    Output:
+        An estimate of the PSD at given frequencies.
+
+    Note: Only a single chunk is held in memory at a time. The mean
+        magnitude of the signal is not known until the last chunk is
+        processed, therefore mean subtraction is applied as a correction
+        to the accumulated sums (see `SpectrumAccumulator`). Results match
+        the "edges" method of `get_snorp_psd` up to floating-point
+        rounding.
+    """
+    accumulator = SpectrumAccumulator(freqs, pulse_magnitude=pulse_magnitude)
+    for pulse_durations, gap_durations in chunks:
+        accumulator.add_events(pulse_durations, gap_durations)
+    return accumulator.psd()
+
+
+def get_snorp_psd_blocks(
+    freqs: np.ndarray,
+    pulse_durations: np.ndarray,
+    gap_durations: np.ndarray,
+    pulse_magnitude: float = 1,
+    n_blocks: int = 1,
+    workers: int = 1,
+) -> np.ndarray:
+    """Calculate PSD of the signal with rectangular pulses block by block.
+
+    Input:
+        freqs:
+            Frequencies for which to obtain the estimates
+            of the PSD.
+        pulse_durations:
+            List containing durations of each pulse in
+            the signal.
+        gap_durations:
+            List containing durations of each interpulse
+            gap in the signal
+        pulse_magnitude: (default: 1)
+            Fixed magnitude of the pulses in the signal.
+        n_blocks: (default: 1)
+            Number of contiguous time blocks (with roughly equal
+            number of events) into which the signal is split.
+        workers: (default: 1)
+            Number of worker processes among which the blocks are
+            distributed. Workers access the durations in shared
+            memory (see `lib.shared.share_arrays`).
+
+    Output:
+        An estimate of the PSD at given frequencies.
+
+    Note: Sums of each block are evaluated relative to the start of the
+        block, thus the phases stay as small as the duration of the block
+        allows. Blocks are then recombined by a single phase shift per
+        block and frequency, which is reduced exactly (see
+        `SpectrumAccumulator.merge`). This keeps the precision on long
+        signals, for which the phase `w * t` would otherwise reach values
+        as large as 1e11.
+    """
+    bounds = np.linspace(0, len(pulse_durations), n_blocks + 1).astype(int)
+    blocks = list(zip(bounds[:-1], bounds[1:]))
+
+    if workers > 1:
+        # workers receive only the handles of the shared durations
+        with share_arrays(
+            {"pulse_durations": pulse_durations, "gap_durations": gap_durations}
+        ) as handles:
+            with ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+            ) as executor:
+                block_accumulators = list(
+                    executor.map(
+                        partial(
+                            __get_shared_block_accumulator,
+                            freqs,
+                            pulse_magnitude,
+                            handles,
+                        ),
+                        blocks,
+                    )
+                )
+    else:
+        block_accumulators = [
+            __get_block_accumulator(
+                freqs,
+                pulse_magnitude,
+                (
+                    pulse_durations[block_from:block_to],
+                    gap_durations[block_from:block_to],
+                ),
             )
-            for omega in angular_freqs
+            for block_from, block_to in blocks
         ]
+
+    accumulator = SpectrumAccumulator(freqs, pulse_magnitude=pulse_magnitude)
+    for block_accumulator in block_accumulators:
+        accumulator.merge(block_accumulator)
+    return accumulator.psd()
+
+
+def get_snorp_psd_parallel(
+    freqs: np.ndarray,
+    pulse_durations: np.ndarray,
+    gap_durations: np.ndarray,
+    workers: int,
+    **kwargs,
+) -> np.ndarray:
+    """Calculate PSD of a large signal splitting frequencies among processes.
+
+    Input:
+        freqs:
+            Frequencies for which to obtain the estimates
+            of the PSD.
+        pulse_durations:
+            List containing durations of each pulse in
+            the signal.
+        gap_durations:
+            List containing durations of each interpulse
+            gap in the signal
+        workers:
+            Number of worker processes among which the frequencies
+            are distributed.
+        **kwargs:
+            Other arguments of `get_snorp_psd` (except those
+            returning the asymptotic mask).
+
+    Output:
+        An estimate of the PSD (or of the Fourier transform, see
+        `get_snorp_psd`) at given frequencies.
+
+    Note: Durations are placed into shared memory once, and the workers
+        receive only their handles, so the event arrays are neither
+        pickled nor duplicated per process. Shared memory is released
+        when the evaluation ends, also if a worker fails. Workers are
+        spawned rather than forked, as forking a process which has
+        already started the threads of the "numba" method may hang.
+    """
+    chunks = np.array_split(freqs, max(1, min(workers, len(freqs))))
+    with share_arrays(
+        {"pulse_durations": pulse_durations, "gap_durations": gap_durations}
+    ) as handles:
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            results = list(
+                executor.map(
+                    partial(__get_shared_psd, handles, kwargs),
+                    chunks,
+                )
+            )
+    return np.concatenate(results, axis=-1)
+
+
+def get_snorp_transition_sums(
+    freqs: np.ndarray,
+    pulse_durations: np.ndarray,
+    gap_durations: np.ndarray,
+    start_time: float = 0,
+) -> tuple[np.ndarray, float]:
+    """Calculate sums over pulse starts and ends of the signal.
+
+    Input:
+        freqs:
+            Frequencies for which to obtain the sums.
+        pulse_durations:
+            List containing durations of each pulse in
+            the signal.
+        gap_durations:
+            List containing durations of each interpulse
+            gap in the signal
+        start_time: (default: 0)
+            Time at which the signal starts (with a gap).
+
+    Output:
+        Sums of `exp(-1j * w * pulse_starts) - exp(-1j * w * pulse_ends)`
+        for each of the angular frequencies `w`, and the time at which
+        the signal ends.
+    """
+    edge_times, edge_signs = __get_chunk_edges(
+        pulse_durations, gap_durations, start_time
     )
+    transition_sums = __get_edge_sums(2 * np.pi * freqs, edge_times, edge_signs)
+    return transition_sums, edge_times[-1]
+
+
+class RectWorkspace:
+    """Reusable working memory of the "direct" method.
+
+    Holds the real buffers in which the per-event terms are evaluated,
+    so that `get_snorp_psd` with the "direct" method does not allocate
+    event-sized arrays for each frequency. The same workspace can be
+    passed to many calls (e.g., to all repeats simulated by a worker).
+
+    Note: Buffers grow to fit the largest signal seen so far and are
+        never shrunk. Workspace must not be shared among threads.
+    """
+
+    def __init__(
+        self,
+        n_events: int = 0,
+    ) -> None:
+        """Create a workspace.
+
+        Input:
+            n_events: (default: 0)
+                Number of events (over all realizations of a batch)
+                for which to preallocate the buffers.
+        """
+        # start times of pulses and gaps, followed by the buffers of
+        # `__get_rect_fourier_inplace`
+        self.buffers = np.empty((8, n_events))
+
+    def get_buffers(
+        self,
+        shape: tuple[int, ...],
+    ) -> list[np.ndarray]:
+        """Get buffers for the event arrays of the given shape.
+
+        Input:
+            shape:
+                Shape of the pulse (and gap) durations.
+
+        Output:
+            Views of the buffers reshaped to `shape`.
+        """
+        size = int(np.prod(shape))
+        if size > self.buffers.shape[1]:
+            self.buffers = np.empty((len(self.buffers), size))
+        return [buffer[:size].reshape(shape) for buffer in self.buffers]
+
+
+class SpectrumAccumulator:
+    """Incrementally updated PSD of the signal with rectangular pulses.
+
+    Holds sums over pulse starts and ends for each frequency together
+    with the total duration of the signal and the total time spent in
+    pulses. Adding new events costs only as much as evaluating the sums
+    over these events, and the PSD can be obtained at any time.
+
+    Note: The PSD (including mean subtraction) is obtained from the held
+        statistics exactly as `get_snorp_psd` would obtain it from all the
+        events added so far.
+    """
+
+    def __init__(
+        self,
+        freqs: np.ndarray,
+        pulse_magnitude: float = 1,
+    ) -> None:
+        """Create an empty accumulator.
+
+        Input:
+            freqs:
+                Frequencies for which to obtain the estimates
+                of the PSD.
+            pulse_magnitude: (default: 1)
+                Fixed magnitude of the pulses in the signal.
+        """
+        self.freqs = np.asarray(freqs, dtype=float)
+        self.pulse_magnitude = pulse_magnitude
+        self.transition_sums = np.zeros(len(self.freqs), dtype=complex)
+        self.total_duration = 0.0
+        self.in_pulse_time = 0.0
+
+    def add_events(
+        self,
+        pulse_durations: np.ndarray,
+        gap_durations: np.ndarray,
+    ) -> None:
+        """Append events to the end of the signal.
+
+        Input:
+            pulse_durations:
+                List containing durations of each new pulse.
+            gap_durations:
+                List containing durations of each new interpulse
+                gap. Each gap precedes the respective pulse.
+        """
+        if len(pulse_durations) == 0:
+            return
+        transition_sums, end_time = get_snorp_transition_sums(
+            self.freqs, pulse_durations, gap_durations, start_time=self.total_duration
+        )
+        self.transition_sums += transition_sums
+        self.total_duration = end_time
+        self.in_pulse_time += np.sum(pulse_durations)
+
+    def merge(self, other: "SpectrumAccumulator") -> None:
+        """Append the signal accumulated by another accumulator.
+
+        Input:
+            other:
+                Accumulator with the same frequencies and pulse
+                magnitude. Its signal is treated as the continuation
+                of the signal held by this accumulator.
+        """
+        if self.pulse_magnitude != other.pulse_magnitude or not np.array_equal(
+            self.freqs, other.freqs
+        ):
+            raise ValueError("Accumulators must share frequencies and magnitude.")
+        # other sums are relative to the start of its own signal
+        shift = self.__get_shift_factors(self.freqs, self.total_duration)
+        self.transition_sums += shift * other.transition_sums
+        self.total_duration += other.total_duration
+        self.in_pulse_time += other.in_pulse_time
+
+    @staticmethod
+    def __get_shift_factors(freqs: np.ndarray, time: float) -> np.ndarray:
+        """Calculate phase shift factors `exp(-2j * pi * freqs * time)`.
+
+        Input:
+            freqs:
+                Frequencies.
+            time:
+                Time shift.
+
+        Output:
+            Phase shift factors for each frequency.
+
+        Note: The product `freqs * time` is evaluated exactly as a sum of
+            two floating point numbers (Dekker's algorithm), so that the
+            whole number of cycles can be dropped without losing the
+            fractional part, even if the product is large.
+        """
+        splitter = 2.0**27 + 1
+        scaled_freqs = splitter * freqs
+        freqs_high = scaled_freqs - (scaled_freqs - freqs)
+        freqs_low = freqs - freqs_high
+        scaled_time = splitter * time
+        time_high = scaled_time - (scaled_time - time)
+        time_low = time - time_high
+
+        cycles = freqs * time
+        error = (
+            (freqs_high * time_high - cycles)
+            + freqs_high * time_low
+            + freqs_low * time_high
+        ) + freqs_low * time_low
+        phases = 2 * np.pi * ((cycles - np.round(cycles)) + error)
+        return np.exp(-1j * phases)
+
+    def psd(self) -> np.ndarray:
+        """Calculate PSD of the signal accumulated so far.
+
+        Output:
+            An estimate of the PSD at the accumulator's frequencies.
+        """
+        angular_freqs = 2 * np.pi * self.freqs
+
+        # subtracting the mean magnitude adds jumps at the start and at the
+        # end of the signal
+        mean_magnitude = self.pulse_magnitude * self.in_pulse_time / self.total_duration
+        sums = self.pulse_magnitude * self.transition_sums - mean_magnitude * (
+            1 - np.exp(-1j * angular_freqs * self.total_duration)
+        )
+        fourier = (-1j / angular_freqs) * sums
+        normalization = 2 / self.total_duration
+        return normalization * (np.real(fourier) ** 2 + np.imag(fourier) ** 2)
+
+
+def __get_threaded(
+    get_chunk: Callable[[np.ndarray], np.ndarray],
+    freqs: np.ndarray,
+    n_threads: int,
+    axis: int = -1,
+) -> np.ndarray:
+    """Evaluate a function of frequencies in parallel threads.
+
+    Input:
+        get_chunk:
+            Function which evaluates the desired quantity for the given
+            (angular) frequencies.
+        freqs:
+            Desired (angular) frequencies.
+        n_threads:
+            Number of threads.
+        axis: (default: -1)
+            Axis of the output of `get_chunk` along which the frequencies
+            are stored.
+
+    Output:
+        Output of `get_chunk` for all of the frequencies.
+
+    Note: Frequencies are split into contiguous chunks, one per thread,
+        so the result is the same as of a single call of `get_chunk`.
+    """
+    n_chunks = min(n_threads, len(freqs))
+    if n_chunks <= 1:
+        return get_chunk(freqs)
+    with ThreadPoolExecutor(max_workers=n_chunks) as executor:
+        results = list(executor.map(get_chunk, np.array_split(freqs, n_chunks)))
+    return np.concatenate(results, axis=axis)
 
 
 def __get_snorp_psd(
@@ -138,4 +1091,816 @@ def __get_rect_fourier(
     constant_terms = magnitude * (1j / angular_freq)
     profiles = np.exp(-1j * angular_freq * durations) - 1
     variable_terms = np.exp(-1j * angular_freq * starts) * profiles
-    return constant_terms * np.sum(variable_terms)
+    return constant_terms * np.sum(variable_terms, axis=-1)
+
+
+def __get_rect_fourier_inplace(
+    angular_freq: float,
+    magnitude: float,
+    durations: np.ndarray,
+    starts: np.ndarray,
+    buffers: list[np.ndarray],
+) -> float:
+    """Calculate Fourier transform of a rectangular pulse without allocations.
+
+    Input:
+        angular_freq:
+            Desired angular frequency.
+        magnitude:
+            Magnitude of the pulses.
+        durations:
+            Durations of the pulses.
+        starts:
+            Start times of the pulses.
+        buffers:
+            Six real arrays of the same shape as `durations`, which
+            are overwritten (see `RectWorkspace`).
+
+    Output:
+        A Fourier transform (complex number) at a given angular
+        frequency.
+
+    Note: Evaluates the same expression as `__get_rect_fourier`, but keeps
+        the real and imaginary parts of the per-event terms in separate
+        preallocated buffers, so only the sums are allocated.
+    """
+    phases, profile_real, profile_imag, wave_real, wave_imag, terms = buffers
+
+    # profile: exp(-i w d) - 1
+    np.multiply(durations, angular_freq, out=phases)
+    np.cos(phases, out=profile_real)
+    np.subtract(profile_real, 1, out=profile_real)
+    np.sin(phases, out=profile_imag)
+    np.negative(profile_imag, out=profile_imag)
+
+    # wave: exp(-i w s)
+    np.multiply(starts, angular_freq, out=phases)
+    np.cos(phases, out=wave_real)
+    np.sin(phases, out=wave_imag)
+    np.negative(wave_imag, out=wave_imag)
+
+    np.multiply(wave_real, profile_real, out=terms)
+    np.multiply(wave_imag, profile_imag, out=phases)
+    np.subtract(terms, phases, out=terms)
+    real_sum = np.sum(terms, axis=-1)
+
+    np.multiply(wave_real, profile_imag, out=terms)
+    np.multiply(wave_imag, profile_real, out=phases)
+    np.add(terms, phases, out=terms)
+    imag_sum = np.sum(terms, axis=-1)
+
+    constant_terms = magnitude * (1j / angular_freq)
+    return constant_terms * (real_sum + 1j * imag_sum)
+
+
+def __get_tiled_rect_sums(
+    angular_freqs: np.ndarray,
+    durations: np.ndarray,
+    starts: np.ndarray,
+    memory_limit: int,
+) -> np.ndarray:
+    """Calculate sums over rectangular pulses block by block.
+
+    Input:
+        angular_freqs:
+            Desired angular frequencies.
+        durations:
+            Durations of the pulses.
+        starts:
+            Start times of the pulses.
+        memory_limit:
+            Approximate upper limit (in bytes) of the working
+            memory used by a single block.
+
+    Output:
+        Sums of `exp(-1j*w*starts) * (exp(-1j*w*durations) - 1)` for
+        each of the angular frequencies `w`.
+
+    Note: Buffers are allocated once for the largest block and reused,
+        trigonometric functions are evaluated in-place to avoid complex
+        temporaries.
+    """
+    n_freqs = len(angular_freqs)
+    n_events = len(durations)
+
+    n_elements = max(1, memory_limit // __TILE_BYTES_PER_ELEMENT)
+    freq_block = max(1, min(n_freqs, n_elements))
+    event_block = max(1, min(n_events, n_elements // freq_block))
+
+    phases_buffer = np.empty(freq_block * event_block)
+    profiles_buffer = np.empty(freq_block * event_block, dtype=complex)
+    terms_buffer = np.empty(freq_block * event_block, dtype=complex)
+
+    sums = np.zeros(n_freqs, dtype=complex)
+    for freq_from in range(0, n_freqs, freq_block):
+        freq_to = min(freq_from + freq_block, n_freqs)
+        omegas = angular_freqs[freq_from:freq_to]
+        for event_from in range(0, n_events, event_block):
+            event_to = min(event_from + event_block, n_events)
+            shape = (freq_to - freq_from, event_to - event_from)
+            size = shape[0] * shape[1]
+            phases = phases_buffer[:size].reshape(shape)
+            profiles = profiles_buffer[:size].reshape(shape)
+            terms = terms_buffer[:size].reshape(shape)
+
+            # profiles = exp(-1j * w * durations) - 1
+            np.multiply.outer(omegas, durations[event_from:event_to], out=phases)
+            np.cos(phases, out=profiles.real)
+            np.sin(phases, out=profiles.imag)
+            np.negative(profiles.imag, out=profiles.imag)
+            profiles.real -= 1
+
+            # terms = exp(-1j * w * starts) * profiles
+            np.multiply.outer(omegas, starts[event_from:event_to], out=phases)
+            np.cos(phases, out=terms.real)
+            np.sin(phases, out=terms.imag)
+            np.negative(terms.imag, out=terms.imag)
+            terms *= profiles
+
+            sums[freq_from:freq_to] += np.sum(terms, axis=1)
+    return sums
+
+
+def __get_edges(
+    pulse_durations: np.ndarray,
+    gap_durations: np.ndarray,
+    pulse_magnitude: float,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Represent the signal by the times of its transitions and the jumps at them.
+
+    Input:
+        pulse_durations:
+            List containing durations of each pulse in the
+            signal.
+        gap_durations:
+            List containing durations of each interpulse gap
+            in the signal.
+        pulse_magnitude:
+            Fixed magnitude of the pulses in the signal.
+
+    Output:
+        Sorted times of the transitions (the first one is the start
+        of the signal, the last one is its end) and the jumps in the
+        value of the signal at these times. Mean magnitude of the
+        signal is already subtracted, and the signal is assumed to be
+        zero outside of the observation window. For a batch of
+        realizations the transitions are along the last axis.
+    """
+    # signal starts with a gap, pulses start at odd and end at even edges
+    batch_shape = np.shape(pulse_durations)[:-1]
+    n_events = np.shape(pulse_durations)[-1]
+    interleaved_durations = np.empty(batch_shape + (2 * n_events,))
+    interleaved_durations[..., 0::2] = gap_durations
+    interleaved_durations[..., 1::2] = pulse_durations
+    edge_times = np.empty(batch_shape + (2 * n_events + 1,))
+    edge_times[..., 0] = 0
+    np.cumsum(interleaved_durations, axis=-1, out=edge_times[..., 1:])
+
+    total_duration = edge_times[..., -1]
+    in_pulse_time = np.sum(pulse_durations, axis=-1)
+    mean_magnitude = pulse_magnitude * in_pulse_time / total_duration
+
+    edge_jumps = np.empty(edge_times.shape)
+    edge_jumps[..., 1::2] = pulse_magnitude
+    edge_jumps[..., 2::2] = -pulse_magnitude
+    # signal jumps from zero to the adjusted gap magnitude at the start, and
+    # from the adjusted pulse magnitude to zero at the end
+    edge_jumps[..., 0] = -mean_magnitude
+    edge_jumps[..., -1] += mean_magnitude
+    return edge_times, edge_jumps
+
+
+def __get_edge_sums(
+    angular_freqs: np.ndarray,
+    edge_times: np.ndarray,
+    edge_jumps: np.ndarray,
+) -> np.ndarray:
+    """Calculate sums over the transitions of the signal.
+
+    Input:
+        angular_freqs:
+            Desired angular frequencies.
+        edge_times:
+            Times of the transitions.
+        edge_jumps:
+            Jumps in the value of the signal at the transitions.
+
+    Output:
+        Sums of `edge_jumps * exp(-1j * w * edge_times)` for each of the
+        angular frequencies `w`.
+
+    Note: Fourier transform of the signal is obtained by multiplying these
+        sums by `-1j / w`.
+    """
+    if edge_times.ndim == 2:
+        return __get_batch_edge_sums(angular_freqs, edge_times, edge_jumps)
+
+    phases = np.empty(len(edge_times))
+    trig = np.empty(len(edge_times))
+    sums = np.empty(len(angular_freqs), dtype=complex)
+    for idx, omega in enumerate(angular_freqs):
+        np.multiply(edge_times, omega, out=phases)
+        np.cos(phases, out=trig)
+        real_part = np.dot(edge_jumps, trig)
+        np.sin(phases, out=trig)
+        sums[idx] = real_part - 1j * np.dot(edge_jumps, trig)
+    return sums
+
+
+def __get_batch_edge_sums(
+    angular_freqs: np.ndarray,
+    edge_times: np.ndarray,
+    edge_jumps: np.ndarray,
+) -> np.ndarray:
+    """Calculate sums over the transitions of a batch of signals.
+
+    Input:
+        angular_freqs:
+            Desired angular frequencies.
+        edge_times:
+            Times of the transitions, one realization per row.
+        edge_jumps:
+            Jumps in the value of the signal at the transitions.
+
+    Output:
+        Sums of `edge_jumps * exp(-1j * w * edge_times)` along the rows
+        for each of the angular frequencies `w`, shape
+        `(repeats, len(angular_freqs))`.
+    """
+    phases = np.empty(edge_times.shape)
+    trig = np.empty(edge_times.shape)
+    sums = np.empty((len(edge_times), len(angular_freqs)), dtype=complex)
+    for idx, omega in enumerate(angular_freqs):
+        np.multiply(edge_times, omega, out=phases)
+        np.cos(phases, out=trig)
+        real_part = np.einsum("ij,ij->i", edge_jumps, trig)
+        np.sin(phases, out=trig)
+        sums[:, idx] = real_part - 1j * np.einsum("ij,ij->i", edge_jumps, trig)
+    return sums
+
+
+def __get_grouped_sums(
+    angular_freqs: np.ndarray,
+    pulse_durations: np.ndarray,
+    gap_durations: np.ndarray,
+    pulse_magnitude: float,
+) -> np.ndarray:
+    """Calculate sums over the transitions grouping events by their durations.
+
+    Input:
+        angular_freqs:
+            Desired angular frequencies.
+        pulse_durations:
+            List containing durations of each pulse in the
+            signal.
+        gap_durations:
+            List containing durations of each interpulse gap
+            in the signal.
+        pulse_magnitude:
+            Fixed magnitude of the pulses in the signal.
+
+    Output:
+        Sums of `edge_jumps * exp(-1j * w * edge_times)` (see
+        `__get_edge_sums`) for each of the angular frequencies `w`.
+
+    Note: Pulse of duration `d` starting at `s` contributes
+        `exp(-1j * w * s) * (1 - exp(-1j * w * d))`, so the sum over the
+        pulses of the same duration is a single factor times the sum
+        over their starts. Likewise the transitions can be paired over
+        the gaps, in which case the remaining boundary term is
+        `1 - exp(-1j * w * T)`. Whichever durations take fewer distinct
+        values are grouped.
+    """
+    edge_times, edge_jumps = __get_edges(
+        pulse_durations, gap_durations, pulse_magnitude
+    )
+    pulse_values, pulse_groups = np.unique(pulse_durations, return_inverse=True)
+    gap_values, gap_groups = np.unique(gap_durations, return_inverse=True)
+    if min(len(pulse_values), len(gap_values)) > __MAX_DURATION_GROUPS:
+        return __get_edge_sums(angular_freqs, edge_times, edge_jumps)
+
+    total_duration = edge_times[-1]
+    # boundary term collects the jumps of the mean magnitude at the start and
+    # at the end of the signal
+    boundary_magnitude = edge_jumps[0]
+    if len(pulse_values) <= len(gap_values):
+        # pulses start at odd edges
+        values, groups, starts = pulse_values, pulse_groups, edge_times[1::2]
+        magnitude = pulse_magnitude
+    else:
+        # gaps start at even edges (except the last one)
+        values, groups, starts = gap_values, gap_groups, edge_times[0:-1:2]
+        magnitude = -pulse_magnitude
+        boundary_magnitude += pulse_magnitude
+
+    phases = np.empty(len(starts))
+    trig = np.empty(len(starts))
+    sums = np.empty(len(angular_freqs), dtype=complex)
+    for idx, omega in enumerate(angular_freqs):
+        np.multiply(starts, omega, out=phases)
+        np.cos(phases, out=trig)
+        real_part = np.bincount(groups, weights=trig, minlength=len(values))
+        np.sin(phases, out=trig)
+        imag_part = np.bincount(groups, weights=trig, minlength=len(values))
+        factors = magnitude * (1 - np.exp(-1j * omega * values))
+        boundary = boundary_magnitude * (1 - np.exp(-1j * omega * total_duration))
+        sums[idx] = np.dot(factors, real_part - 1j * imag_part) + boundary
+    return sums
+
+
+def __get_lattice_sums(
+    freqs: np.ndarray,
+    edge_times: np.ndarray,
+    edge_jumps: np.ndarray,
+    lattice_step: float,
+    grid_limit: int,
+) -> np.ndarray:
+    """Calculate sums over the transitions lying on a lattice.
+
+    Input:
+        freqs:
+            Desired frequencies.
+        edge_times:
+            Times of the transitions, integer multiples of
+            `lattice_step` (up to rounding errors).
+        edge_jumps:
+            Jumps in the value of the signal at the transitions.
+        lattice_step:
+            Spacing of the lattice.
+        grid_limit:
+            Maximum length of the FFT.
+
+    Output:
+        Sums of `edge_jumps * exp(-2j * pi * f * edge_times)` for each of
+        the frequencies `f`.
+
+    Note: With `z = exp(-2j * pi * f * lattice_step)` the sums are
+        polynomials in `z`, whose coefficients are the jumps accumulated
+        at each lattice point. Hence the sums are periodic in `f` with
+        period `1 / lattice_step`, and at the natural frequencies (with
+        the last lattice point wrapping onto the first one) they are
+        given by the discrete Fourier transform of the coefficients.
+    """
+    # accumulated durations carry rounding errors, which are tolerated as
+    # long as they are much smaller than the lattice step
+    edge_ticks = np.rint(edge_times / lattice_step).astype(np.int64)
+    if np.any(np.abs(edge_ticks * lattice_step - edge_times) > 1e-3 * lattice_step):
+        raise ValueError("Transitions do not lie on the lattice.")
+    n_ticks = int(edge_ticks[-1])
+
+    # fractions of the cycle per lattice step, reduced by the periodicity;
+    # only the rounding errors of obtaining the harmonic number are
+    # tolerated, other frequencies are summed over the lattice points
+    cycles = np.mod(freqs * lattice_step, 1)
+    harmonics = np.rint(cycles * n_ticks)
+    on_grid = (
+        np.abs(cycles * n_ticks - harmonics)
+        <= __LATTICE_HARMONIC_ULPS * np.spacing(float(n_ticks))
+    ) & (n_ticks <= grid_limit)
+
+    sums = np.empty(len(freqs), dtype=complex)
+    if np.any(on_grid):
+        coefficients = np.bincount(
+            edge_ticks % n_ticks, weights=edge_jumps, minlength=n_ticks
+        )
+        spectrum = np.fft.rfft(coefficients)
+        # coefficients are real, so the upper half is the complex conjugate
+        harmonics = harmonics[on_grid].astype(np.int64) % n_ticks
+        is_upper = harmonics > n_ticks // 2
+        harmonics[is_upper] = n_ticks - harmonics[is_upper]
+        grid_sums = spectrum[harmonics]
+        grid_sums[is_upper] = np.conj(grid_sums[is_upper])
+        sums[on_grid] = grid_sums
+
+    off_grid = ~on_grid
+    if np.any(off_grid):
+        occupied_ticks, tick_index = np.unique(edge_ticks, return_inverse=True)
+        tick_jumps = np.bincount(tick_index, weights=edge_jumps)
+        sums[off_grid] = __get_edge_sums(
+            2 * np.pi * cycles[off_grid] / lattice_step,
+            occupied_ticks * lattice_step,
+            tick_jumps,
+        )
+    return sums
+
+
+def __get_edge_sums_float32(
+    freqs: np.ndarray,
+    edge_times: np.ndarray,
+    edge_jumps: np.ndarray,
+) -> np.ndarray:
+    """Calculate sums over the transitions of the signal in single precision.
+
+    Input:
+        freqs:
+            Desired frequencies.
+        edge_times:
+            Times of the transitions.
+        edge_jumps:
+            Jumps in the value of the signal at the transitions.
+
+    Output:
+        Sums of `edge_jumps * exp(-2j * pi * f * edge_times)` for each of
+        the frequencies `f`.
+
+    Note: Number of cycles `f * edge_times` is reduced to the interval
+        [-1/2, 1/2] in double precision, so that the single precision
+        phases are small and lose no more than the single precision
+        rounding. Products are summed in double precision.
+    """
+    cycles = np.empty(len(edge_times))
+    whole_cycles = np.empty(len(edge_times))
+    phases = np.empty(len(edge_times), dtype=np.float32)
+    terms = np.empty(len(edge_times), dtype=np.float32)
+    jumps = edge_jumps.astype(np.float32)
+    sums = np.empty(len(freqs), dtype=complex)
+    for idx, freq in enumerate(freqs):
+        np.multiply(edge_times, freq, out=cycles)
+        np.rint(cycles, out=whole_cycles)
+        np.subtract(cycles, whole_cycles, out=cycles)
+        np.multiply(cycles, 2 * np.pi, out=phases)
+        np.cos(phases, out=terms)
+        np.multiply(terms, jumps, out=terms)
+        real_part = np.sum(terms, dtype=np.float64)
+        np.sin(phases, out=terms)
+        np.multiply(terms, jumps, out=terms)
+        sums[idx] = real_part - 1j * np.sum(terms, dtype=np.float64)
+    return sums
+
+
+def __get_asymptotic_mask(
+    freqs: np.ndarray,
+    pulse_durations: np.ndarray,
+    gap_durations: np.ndarray,
+    tolerance: float,
+) -> np.ndarray:
+    """Find frequencies at which PSD is close to its high frequency asymptote.
+
+    Input:
+        freqs:
+            Desired frequencies.
+        pulse_durations:
+            List containing durations of each pulse in the
+            signal.
+        gap_durations:
+            List containing durations of each interpulse gap
+            in the signal.
+        tolerance:
+            Allowed relative deviation from the asymptote.
+
+    Output:
+        Boolean array marking the frequencies at which the deviation
+        does not exceed the tolerance.
+
+    Note: For independent durations the PSD equals the asymptote times
+        `Re[(1 - a) * (1 - b) / (1 - a * b)]`, where `a` and `b` are the
+        characteristic functions of pulse and gap durations. Its relative
+        deviation from unity is at most
+        `(|a| + |b| + 2 * |a| * |b|) / (1 - |a| * |b|)`. Characteristic
+        functions are estimated from evenly strided samples of durations,
+        and their moduli are raised by twice the standard error of the
+        estimate. Thus the check is a statistical one (roughly at the two
+        sigma level) rather than a strict bound, and it does not hold if
+        the durations are correlated (i.e., the signal is not a renewal
+        process).
+    """
+    pulse_sample = pulse_durations[
+        :: max(1, len(pulse_durations) // __TAIL_SAMPLE_SIZE)
+    ]
+    gap_sample = gap_durations[:: max(1, len(gap_durations) // __TAIL_SAMPLE_SIZE)]
+    pulse_error = 2 / np.sqrt(len(pulse_sample))
+    gap_error = 2 / np.sqrt(len(gap_sample))
+
+    is_asymptotic = np.zeros(len(freqs), dtype=bool)
+    for idx, omega in enumerate(2 * np.pi * freqs):
+        pulse_cf = np.abs(np.mean(np.exp(-1j * omega * pulse_sample))) + pulse_error
+        gap_cf = np.abs(np.mean(np.exp(-1j * omega * gap_sample))) + gap_error
+        if pulse_cf * gap_cf >= 1:
+            continue
+        deviation = (pulse_cf + gap_cf + 2 * pulse_cf * gap_cf) / (
+            1 - pulse_cf * gap_cf
+        )
+        is_asymptotic[idx] = deviation <= tolerance
+    return is_asymptotic
+
+
+def __get_moment_sums(
+    angular_freqs: np.ndarray,
+    edge_times: np.ndarray,
+    edge_jumps: np.ndarray,
+    tolerance: float,
+) -> np.ndarray:
+    """Calculate sums over the transitions of the signal from their moments.
+
+    Input:
+        angular_freqs:
+            Desired angular frequencies. Should be low, so that
+            `w * T / 2` is of order one or smaller.
+        edge_times:
+            Times of the transitions. The first one is the start of the
+            signal (at zero), the last one is the end of the signal.
+        edge_jumps:
+            Jumps in the value of the signal at the transitions.
+        tolerance:
+            Desired accuracy relative to the sum of absolute jumps.
+
+    Output:
+        Sums of `edge_jumps * exp(-1j * w * edge_times)` for each of the
+        angular frequencies `w`.
+
+    Note: With `c = T / 2` and `u = (t - c) / c` the exponential is
+        expanded as `exp(-1j * w * c) * sum_p (-1j * w * c * u)**p / p!`.
+        Moments `sum(edge_jumps * u**p)` are computed once, after which
+        each frequency costs only as much as the number of terms. As
+        `|u| <= 1`, the remainder after `P` terms is bounded by
+        `sum(|edge_jumps|) * (w * c)**P / P!`.
+    """
+    half_duration = edge_times[-1] / 2
+    arguments = angular_freqs * half_duration
+
+    max_argument = np.max(arguments)
+    n_terms = 1
+    remainder = max_argument
+    while remainder > tolerance:
+        n_terms += 1
+        remainder = remainder * max_argument / n_terms
+
+    scaled_times = (edge_times - half_duration) / half_duration
+    moments = np.empty(n_terms)
+    weights = edge_jumps.copy()
+    for term in range(n_terms):
+        if term > 0:
+            weights *= scaled_times
+        moments[term] = np.sum(weights)
+
+    series = np.zeros(len(angular_freqs), dtype=complex)
+    coefficients = np.ones(len(angular_freqs), dtype=complex)
+    for term in range(n_terms):
+        if term > 0:
+            coefficients *= -1j * arguments / term
+        series += coefficients * moments[term]
+    return np.exp(-1j * angular_freqs * half_duration) * series
+
+
+def __get_recurrence_sums(
+    angular_freqs: np.ndarray,
+    edge_times: np.ndarray,
+    edge_jumps: np.ndarray,
+    anchor_every: int,
+) -> np.ndarray:
+    """Calculate sums over the transitions of the signal using recurrence.
+
+    Input:
+        angular_freqs:
+            Desired angular frequencies.
+        edge_times:
+            Times of the transitions.
+        edge_jumps:
+            Jumps in the value of the signal at the transitions.
+        anchor_every:
+            Maximum number of consecutive frequencies for which the
+            exponentials are obtained by the recurrence.
+
+    Output:
+        Sums of `edge_jumps * exp(-1j * w * edge_times)` for each of the
+        angular frequencies `w`.
+
+    Note: Frequency grid is split into runs of evenly spaced frequencies.
+        Within a run `exp(-1j * (w + dw) * t)` is obtained by multiplying
+        `exp(-1j * w * t)` by `exp(-1j * dw * t)`, which requires a single
+        complex multiplication per transition. Each run (and every
+        `anchor_every` frequencies within it) is anchored by evaluating
+        the exponentials directly, which bounds the drift of both phase
+        and magnitude.
+    """
+    n_freqs = len(angular_freqs)
+    sums = np.empty(n_freqs, dtype=complex)
+
+    run_from = 0
+    while run_from < n_freqs:
+        # find evenly spaced run of frequencies
+        run_to = min(run_from + 2, n_freqs)
+        freq_step = angular_freqs[run_to - 1] - angular_freqs[run_from]
+        while run_to < n_freqs and np.abs(
+            angular_freqs[run_to] - angular_freqs[run_to - 1] - freq_step
+        ) <= 1e-9 * np.abs(freq_step):
+            run_to += 1
+
+        steps = np.exp(-1j * freq_step * edge_times)
+        for idx in range(run_from, run_to):
+            if (idx - run_from) % anchor_every == 0:
+                exponentials = np.exp(-1j * angular_freqs[idx] * edge_times)
+            else:
+                exponentials *= steps
+            sums[idx] = np.dot(edge_jumps, exponentials)
+        run_from = run_to
+    return sums
+
+
+def __get_natural_sums(
+    angular_freqs: np.ndarray,
+    edge_times: np.ndarray,
+    edge_jumps: np.ndarray,
+    tolerance: float,
+    grid_limit: int,
+    anchor_every: int,
+) -> np.ndarray:
+    """Calculate sums over the transitions of the signal at natural frequencies.
+
+    Input:
+        angular_freqs:
+            Desired angular frequencies.
+        edge_times:
+            Times of the transitions. The first one is the start of the
+            signal (at zero), the last one is the end of the signal.
+        edge_jumps:
+            Jumps in the value of the signal at the transitions.
+        tolerance:
+            Desired accuracy relative to the sum of absolute jumps.
+        grid_limit:
+            Maximum number of bins of the fine time grid.
+        anchor_every:
+            Passed to the recurrence engine, which handles frequencies
+            that are not natural or are too high.
+
+    Output:
+        Sums of `edge_jumps * exp(-1j * w * edge_times)` for each of the
+        angular frequencies `w`.
+
+    Note: Transition time `t = (m + d) * h` is split into the index of
+        the nearest bin `m` and the offset from its center `|d| <= 1/2`.
+        For the `n`-th harmonic `exp(-2j * pi * n * d / M)` is expanded
+        into the Taylor series in `d`, thus each term of the series
+        requires a single histogram of `edge_jumps * d**p` and a single
+        real FFT. The series is truncated when the remainder drops below
+        `tolerance`.
+    """
+    total_duration = edge_times[-1]
+    harmonics = angular_freqs * total_duration / (2 * np.pi)
+    rounded_harmonics = np.rint(harmonics).astype(np.int64)
+    n_grid = int(grid_limit)
+    max_harmonic = n_grid // __NATURAL_OVERSAMPLING
+    is_natural = (
+        (np.abs(harmonics - rounded_harmonics) <= 1e-9 * np.abs(harmonics))
+        & (rounded_harmonics >= 1)
+        & (rounded_harmonics <= max_harmonic)
+    )
+
+    sums = np.empty(len(angular_freqs), dtype=complex)
+    if not np.all(is_natural):
+        sums[~is_natural] = __get_recurrence_sums(
+            angular_freqs[~is_natural], edge_times, edge_jumps, anchor_every
+        )
+    if not np.any(is_natural):
+        return sums
+
+    # use the smallest power of two grid which oversamples the highest
+    # harmonic
+    natural_harmonics = rounded_harmonics[is_natural]
+    n_grid = min(
+        n_grid,
+        int(2 ** np.ceil(np.log2(__NATURAL_OVERSAMPLING * np.max(natural_harmonics)))),
+    )
+
+    scaled_times = edge_times * (n_grid / total_duration)
+    bins = np.rint(scaled_times)
+    offsets = scaled_times - bins
+    bins = bins.astype(np.int64) % n_grid
+
+    # number of Taylor terms: |2 * pi * n * d / M| <= pi / oversampling
+    max_argument = np.pi * np.max(natural_harmonics) / n_grid
+    n_terms = 1
+    remainder = max_argument
+    while remainder > tolerance:
+        n_terms += 1
+        remainder = remainder * max_argument / n_terms
+
+    natural_sums = np.zeros(len(natural_harmonics), dtype=complex)
+    weights = edge_jumps.copy()
+    coefficients = np.ones(len(natural_harmonics), dtype=complex)
+    factor = -2j * np.pi * natural_harmonics / n_grid
+    for term in range(n_terms):
+        if term > 0:
+            weights *= offsets
+            coefficients *= factor / term
+        histogram = np.bincount(bins, weights=weights, minlength=n_grid)
+        natural_sums += coefficients * np.fft.rfft(histogram)[natural_harmonics]
+    sums[is_natural] = natural_sums
+    return sums
+
+
+def __get_chunk_edges(
+    pulse_durations: np.ndarray,
+    gap_durations: np.ndarray,
+    start_time: float,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Get pulse starts and ends of a chunk of the signal.
+
+    Input:
+        pulse_durations:
+            List containing durations of each pulse in the
+            chunk.
+        gap_durations:
+            List containing durations of each interpulse gap
+            in the chunk.
+        start_time:
+            Time at which the chunk starts (with a gap).
+
+    Output:
+        Sorted times of the pulse starts and ends, and unit jumps
+        (positive at the starts, negative at the ends).
+
+    Note: Times are accumulated in the same order as if the whole signal
+        was processed at once, so they do not depend on the chunking.
+    """
+    interleaved_durations = np.empty(2 * len(pulse_durations))
+    interleaved_durations[0::2] = gap_durations
+    interleaved_durations[1::2] = pulse_durations
+    interleaved_durations[0] += start_time
+    edge_times = np.cumsum(interleaved_durations)
+
+    edge_signs = np.empty(len(edge_times))
+    edge_signs[0::2] = 1
+    edge_signs[1::2] = -1
+    return edge_times, edge_signs
+
+
+def __get_block_accumulator(
+    freqs: np.ndarray,
+    pulse_magnitude: float,
+    block: tuple[np.ndarray, np.ndarray],
+) -> SpectrumAccumulator:
+    """Accumulate sums over a single block of the signal.
+
+    Input:
+        freqs:
+            Frequencies for which to obtain the sums.
+        pulse_magnitude:
+            Fixed magnitude of the pulses in the signal.
+        block:
+            Pulse durations and gap durations within the block.
+
+    Output:
+        Accumulator holding the sums relative to the start of the block.
+    """
+    accumulator = SpectrumAccumulator(freqs, pulse_magnitude=pulse_magnitude)
+    accumulator.add_events(*block)
+    return accumulator
+
+
+def __get_shared_block_accumulator(
+    freqs: np.ndarray,
+    pulse_magnitude: float,
+    handles: dict[str, SharedArrayHandle],
+    bounds: tuple[int, int],
+) -> SpectrumAccumulator:
+    """Accumulate sums over a single block of the signal held in shared memory.
+
+    Input:
+        freqs:
+            Frequencies for which to obtain the sums.
+        pulse_magnitude:
+            Fixed magnitude of the pulses in the signal.
+        handles:
+            Handles of the shared pulse and gap durations.
+        bounds:
+            Indices of the first event of the block and of the first
+            event after the block.
+
+    Output:
+        Accumulator holding the sums relative to the start of the block.
+    """
+    block_from, block_to = bounds
+    with attach_arrays(handles) as arrays:
+        return __get_block_accumulator(
+            freqs,
+            pulse_magnitude,
+            (
+                arrays["pulse_durations"][block_from:block_to],
+                arrays["gap_durations"][block_from:block_to],
+            ),
+        )
+
+
+def __get_shared_psd(
+    handles: dict[str, SharedArrayHandle],
+    kwargs: dict,
+    freqs: np.ndarray,
+) -> np.ndarray:
+    """Calculate PSD of the signal held in shared memory.
+
+    Input:
+        handles:
+            Handles of the shared pulse and gap durations.
+        kwargs:
+            Other arguments of `get_snorp_psd`.
+        freqs:
+            Frequencies for which to obtain the estimates of the PSD.
+
+    Output:
+        Output of `get_snorp_psd`.
+    """
+    with attach_arrays(handles) as arrays:
+        return get_snorp_psd(
+            freqs, arrays["pulse_durations"], arrays["gap_durations"], **kwargs
+        )
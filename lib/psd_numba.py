@@ -0,0 +1,72 @@
+import numpy as np
+
+try:
+    import numba  # type: ignore
+except ImportError:
+    numba = None
+
+prange = range if numba is None else numba.prange
+
+
+def __get_fused_edge_sums(
+    angular_freqs: np.ndarray,
+    pulse_durations: np.ndarray,
+    gap_durations: np.ndarray,
+    pulse_magnitude: float,
+    mean_magnitude: float,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Calculate sums over the transitions of the signal in a fused loop.
+
+    Input:
+        angular_freqs:
+            Desired angular frequencies.
+        pulse_durations:
+            List containing durations of each pulse in the
+            signal.
+        gap_durations:
+            List containing durations of each interpulse gap
+            in the signal.
+        pulse_magnitude:
+            Fixed magnitude of the pulses in the signal.
+        mean_magnitude:
+            Mean magnitude of the signal.
+
+    Output:
+        Real and imaginary parts of the sums over the transitions of
+        the signal (see `lib.psd`) for each of the angular frequencies.
+
+    Note: Transition times are accumulated on the fly in the same order
+        as `np.cumsum` would, so no intermediate arrays are allocated.
+    """
+    n_freqs = len(angular_freqs)
+    n_events = len(pulse_durations)
+    real_sums = np.empty(n_freqs)
+    imag_sums = np.empty(n_freqs)
+    for idx in prange(n_freqs):
+        omega = angular_freqs[idx]
+        # signal jumps from zero to the adjusted gap magnitude at the start
+        real_sum = -mean_magnitude
+        imag_sum = 0.0
+        t = 0.0
+        for event_idx in range(n_events):
+            t += gap_durations[event_idx]
+            real_sum += pulse_magnitude * np.cos(omega * t)
+            imag_sum -= pulse_magnitude * np.sin(omega * t)
+            t += pulse_durations[event_idx]
+            real_sum -= pulse_magnitude * np.cos(omega * t)
+            imag_sum += pulse_magnitude * np.sin(omega * t)
+        # and from the adjusted pulse magnitude to zero at the end
+        real_sum += mean_magnitude * np.cos(omega * t)
+        imag_sum -= mean_magnitude * np.sin(omega * t)
+        real_sums[idx] = real_sum
+        imag_sums[idx] = imag_sum
+    return real_sums, imag_sums
+
+
+# compiled kernel is cached on disk, so the compilation cost is paid only once
+# rather than on every run; `None` if numba is not installed
+get_fused_edge_sums = (
+    None
+    if numba is None
+    else numba.njit(parallel=True, cache=True)(__get_fused_edge_sums)
+)
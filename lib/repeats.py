@@ -0,0 +1,267 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Callable
+
+import numpy as np
+
+# repeats are split into at most this many contiguous blocks, which are the
+# units of work given to the worker processes
+__MAX_BLOCKS = 64
+
+# two-sided 95% quantile of the normal distribution, sets the confidence
+# level of the error estimate used to stop adding repeats
+__CONFIDENCE_QUANTILE = 1.96
+
+# smallest number of repeats added in a single round when the required
+# number of repeats is extrapolated from the current error estimate
+__MIN_ROUND_SIZE = 8
+
+
+def get_mean_psd(
+    simulate_psd: Callable[[np.random.Generator], np.ndarray],
+    repeats: int,
+    seed: int,
+    workers: int = 1,
+    first_repeat: int = 0,
+    legacy_rng: bool = False,
+    batched: bool = False,
+) -> np.ndarray:
+    """Average PSD over independent repeats of the simulation.
+
+    Input:
+        simulate_psd:
+            Function which simulates a single realization using the
+            given RNG and returns its PSD. When `workers > 1` the
+            function must be picklable (e.g., a module level function
+            or a `functools.partial` of it).
+        repeats:
+            Number of realizations to average over.
+        seed:
+            RNG seed. Each realization gets its own RNG stream spawned
+            from this seed (see `get_repeat_rng`).
+        workers: (default: 1)
+            Number of worker processes among which the realizations
+            are distributed.
+        first_repeat: (default: 0)
+            Index of the first realization. Allows to split a large
+            number of realizations into independent shards.
+        legacy_rng: (default: False)
+            Draw all realizations sequentially from a single RNG
+            stream seeded by `seed`. Reproduces results obtained
+            before per-realization streams were introduced. Can not
+            be used together with multiple workers or shards.
+        batched: (default: False)
+            If True, then `simulate_psd` is called once per block
+            with a list of RNGs (one per realization), and has to
+            return the PSDs of all of them as rows of a single
+            array (e.g., using batches of `lib.psd.get_snorp_psd`).
+
+    Output:
+        PSD averaged over all realizations.
+
+    Note: Realizations are split into blocks independently of the number
+        of workers, each block is summed by a worker, and the block sums
+        are added in a fixed order. Hence the result for a given seed
+        does not depend on the number of workers.
+    """
+    if legacy_rng:
+        if workers > 1 or first_repeat > 0:
+            raise ValueError("Legacy RNG stream can not be split.")
+        rng = np.random.default_rng(seed)
+        if batched:
+            return np.mean(simulate_psd([rng] * repeats), axis=0)
+        return np.mean([simulate_psd(rng) for _ in range(repeats)], axis=0)
+
+    seed_sequences = [
+        __get_repeat_seed_sequence(seed, repeat_idx)
+        for repeat_idx in range(first_repeat, first_repeat + repeats)
+    ]
+    n_blocks = min(repeats, __MAX_BLOCKS)
+    blocks = [list(block) for block in np.array_split(seed_sequences, n_blocks)]
+
+    simulate_block = partial(__simulate_block, simulate_psd, batched)
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            block_sums = list(executor.map(simulate_block, blocks))
+    else:
+        block_sums = [simulate_block(block) for block in blocks]
+
+    total = block_sums[0]
+    for block_sum in block_sums[1:]:
+        total = total + block_sum
+    return total / repeats
+
+
+def get_mean_psd_to_error(
+    simulate_psd: Callable[[np.random.Generator], np.ndarray],
+    target_rel_error: float,
+    min_repeats: int,
+    max_repeats: int,
+    seed: int,
+    workers: int = 1,
+    legacy_rng: bool = False,
+) -> tuple[np.ndarray, np.ndarray, int]:
+    """Average PSD over as many repeats as needed to reach the desired accuracy.
+
+    Input:
+        simulate_psd:
+            Function which simulates a single realization using the
+            given RNG and returns its PSD. When `workers > 1` the
+            function must be picklable.
+        target_rel_error:
+            Desired half-width of the 95% confidence interval of the
+            mean PSD relative to the mean PSD (i.e., the half-width in
+            the natural logarithm of the PSD). Has to be achieved at
+            every frequency.
+        min_repeats:
+            Number of realizations simulated before the error is
+            checked for the first time.
+        max_repeats:
+            Maximum number of realizations to simulate.
+        seed:
+            RNG seed. Realizations use the same RNG streams as in
+            `get_mean_psd`.
+        workers: (default: 1)
+            Number of worker processes among which the realizations
+            are distributed.
+        legacy_rng: (default: False)
+            Draw all realizations sequentially from a single RNG
+            stream seeded by `seed`. Requires a single worker.
+
+    Output:
+        Tuple of the mean PSD, the achieved relative error at each
+        frequency, and the number of realizations simulated.
+
+    Note: Mean and variance are updated online (Welford's algorithm) in
+        the order of the realizations. The number of realizations added
+        in each round is extrapolated from the current error, assuming
+        that it decreases as the inverse square root of the number of
+        realizations, but is at most doubled per round. Hence the result
+        for a given seed does not depend on the number of workers.
+    """
+    if legacy_rng and workers > 1:
+        raise ValueError("Legacy RNG stream can not be split.")
+    legacy_stream = np.random.default_rng(seed) if legacy_rng else None
+
+    n_repeats = 0
+    mean = np.zeros(0)
+    squares = np.zeros(0)
+    rel_error = np.zeros(0)
+    round_size = min(max(min_repeats, 2), max_repeats)
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        while round_size > 0:
+            if legacy_stream is not None:
+                rngs = [legacy_stream] * round_size
+            else:
+                rngs = [
+                    get_repeat_rng(seed, repeat_idx)
+                    for repeat_idx in range(n_repeats, n_repeats + round_size)
+                ]
+            if executor is not None:
+                psds = executor.map(simulate_psd, rngs)
+            else:
+                psds = map(simulate_psd, rngs)
+
+            for psd in psds:
+                n_repeats += 1
+                if n_repeats == 1:
+                    mean = np.array(psd, dtype=float)
+                    squares = np.zeros(mean.shape)
+                    continue
+                delta = psd - mean
+                mean += delta / n_repeats
+                squares += delta * (psd - mean)
+
+            with np.errstate(divide="ignore", invalid="ignore"):
+                rel_error = (
+                    __CONFIDENCE_QUANTILE
+                    * np.sqrt(squares / ((n_repeats - 1) * n_repeats))
+                    / mean
+                )
+            max_error = np.max(rel_error)
+            if max_error <= target_rel_error:
+                break
+            round_limit = min(n_repeats, max_repeats - n_repeats)
+            if round_limit <= 0:
+                break
+            if not np.isfinite(max_error):
+                # error is unknown (e.g., zero mean PSD), so it is treated as
+                # not converged and the number of realizations is doubled
+                round_size = round_limit
+                continue
+            required = n_repeats * (max_error / target_rel_error) ** 2
+            round_size = int(
+                min(max(np.ceil(required) - n_repeats, __MIN_ROUND_SIZE), round_limit)
+            )
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return mean, rel_error, n_repeats
+
+
+def get_repeat_rng(seed: int, repeat_idx: int) -> np.random.Generator:
+    """Get RNG of a single realization.
+
+    Input:
+        seed:
+            RNG seed of the whole simulation.
+        repeat_idx:
+            Index of the realization.
+
+    Output:
+        RNG stream of the realization, which is independent of the
+        streams of the other realizations. The stream is the same as
+        the one used by `get_mean_psd`, so any realization can be
+        regenerated in isolation.
+    """
+    return np.random.default_rng(__get_repeat_seed_sequence(seed, repeat_idx))
+
+
+def __get_repeat_seed_sequence(
+    seed: int,
+    repeat_idx: int,
+) -> np.random.SeedSequence:
+    """Get seed sequence of a single realization.
+
+    Input:
+        seed:
+            RNG seed of the whole simulation.
+        repeat_idx:
+            Index of the realization.
+
+    Output:
+        Seed sequence equal to the `repeat_idx`-th child spawned from
+        `np.random.SeedSequence(seed)`.
+    """
+    return np.random.SeedSequence(seed, spawn_key=(repeat_idx,))
+
+
+def __simulate_block(
+    simulate_psd: Callable,
+    batched: bool,
+    seed_sequences: list[np.random.SeedSequence],
+) -> np.ndarray:
+    """Sum PSDs of the realizations within a single block.
+
+    Input:
+        simulate_psd:
+            Function which simulates a single realization using the
+            given RNG and returns its PSD.
+        batched:
+            Whether `simulate_psd` simulates all realizations of the
+            block at once, given a list of their RNGs.
+        seed_sequences:
+            Seed sequences of the realizations in the block.
+
+    Output:
+        Sum of the PSDs of the realizations.
+    """
+    if batched:
+        rngs = [np.random.default_rng(sequence) for sequence in seed_sequences]
+        return np.sum(simulate_psd(rngs), axis=0)
+
+    total = simulate_psd(np.random.default_rng(seed_sequences[0]))
+    for seed_sequence in seed_sequences[1:]:
+        total = total + simulate_psd(np.random.default_rng(seed_sequence))
+    return total
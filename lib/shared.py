@@ -0,0 +1,81 @@
+from contextlib import contextmanager
+from multiprocessing.shared_memory import SharedMemory
+from typing import Iterator
+
+import numpy as np
+
+# name of the shared memory segment, shape and dtype of the array in it
+SharedArrayHandle = tuple[str, tuple[int, ...], str]
+
+
+@contextmanager
+def share_arrays(
+    arrays: dict[str, np.ndarray],
+) -> Iterator[dict[str, SharedArrayHandle]]:
+    """Copy arrays into shared memory for the duration of the context.
+
+    Input:
+        arrays:
+            Arrays to share, keyed by their names.
+
+    Output:
+        Handles of the shared arrays (see `attach_arrays`), which are
+        small and cheap to send to the worker processes.
+
+    Note: Segments are unlinked when the context is left, also if it is
+        left due to an exception (e.g., a crashed worker process breaking
+        the pool). Should the main process itself be killed, the segments
+        are released by the resource tracker of `multiprocessing`.
+    """
+    segments = []
+    try:
+        handles = {}
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            segment = SharedMemory(create=True, size=max(array.nbytes, 1))
+            segments += [segment]
+            shared = np.ndarray(array.shape, dtype=array.dtype, buffer=segment.buf)
+            shared[...] = array
+            del shared
+            handles[name] = (segment.name, array.shape, array.dtype.str)
+        yield handles
+    finally:
+        for segment in segments:
+            segment.close()
+            segment.unlink()
+
+
+@contextmanager
+def attach_arrays(
+    handles: dict[str, SharedArrayHandle],
+) -> Iterator[dict[str, np.ndarray]]:
+    """Access arrays shared by `share_arrays` without copying them.
+
+    Input:
+        handles:
+            Handles of the shared arrays.
+
+    Output:
+        Read-only views of the shared arrays, keyed by their names. Views
+        are valid only within the context, so results which outlive it
+        must not reference them.
+    """
+    segments = []
+    arrays = {}
+    try:
+        for name, (segment_name, shape, dtype) in handles.items():
+            segment = SharedMemory(name=segment_name)
+            segments += [segment]
+            arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=segment.buf)
+            arrays[name].flags.writeable = False
+        yield arrays
+    finally:
+        # views have to be released before the segments can be closed
+        arrays.clear()
+        for segment in segments:
+            try:
+                segment.close()
+            except BufferError:
+                # views still referenced elsewhere (e.g., by a traceback)
+                # are released together with the process
+                pass
@@ -0,0 +1,202 @@
+import json
+import os
+from typing import Callable
+
+import numpy as np
+
+from lib.psd import get_snorp_psd
+from lib.repeats import get_repeat_rng
+
+
+class RealizationStore:
+    """On-disk store of simulated realizations and their Fourier transforms.
+
+    Input:
+        root:
+            Folder in which the store is kept.
+        model_info:
+            String identifying the model and its parameters (as used
+            in the names of the output files).
+        seed:
+            RNG seed of the simulation. Realizations are generated
+            using the RNG streams of `lib.repeats.get_repeat_rng`.
+        pulse_magnitude: (default: 1)
+            Fixed magnitude of the pulses in the signal.
+        method: (default: "edges")
+            Method used to evaluate the Fourier transforms, see
+            `lib.psd.get_snorp_psd`.
+        parameters: (default: None)
+            Parameters of the simulated realizations (e.g., mean
+            durations and the duration of the signal). Should
+            include every parameter which is not encoded in
+            `model_info`.
+
+    Note: Each realization is stored as pulse and gap durations (loaded
+        memory-mapped) and the Fourier transforms already evaluated for
+        it. Asking for new frequencies evaluates only the missing ones
+        and appends them to the store, so frequency grids can be
+        extended and statistics recomputed without rerunning the
+        simulation. Method, pulse magnitude and parameters are recorded in
+        the metadata file of the store, and a store created with different
+        ones is not reused.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        model_info: str,
+        seed: int,
+        pulse_magnitude: float = 1,
+        method: str = "edges",
+        parameters: dict[str, float] | None = None,
+    ) -> None:
+        self.path = os.path.join(root, f"{model_info}.seed{seed:d}")
+        self.seed = seed
+        self.pulse_magnitude = pulse_magnitude
+        self.method = method
+        os.makedirs(self.path, exist_ok=True)
+
+        metadata = {
+            "method": method,
+            "pulse_magnitude": float(pulse_magnitude),
+            "parameters": {
+                name: float(value) for name, value in (parameters or {}).items()
+            },
+        }
+        metadata_path = os.path.join(self.path, "metadata.json")
+        if os.path.exists(metadata_path):
+            with open(metadata_path) as metadata_file:
+                stored_metadata = json.load(metadata_file)
+            if stored_metadata != metadata:
+                raise ValueError(
+                    f"Store {self.path} was created with different settings: "
+                    f"{stored_metadata} (requested {metadata})."
+                )
+        elif os.listdir(self.path):
+            raise ValueError(f"Store {self.path} has no metadata, can not reuse it.")
+        else:
+            with open(metadata_path, "w") as metadata_file:
+                json.dump(metadata, metadata_file, indent=4)
+
+    def get_events(
+        self,
+        repeat_idx: int,
+        simulate_durations: Callable[
+            [np.random.Generator], tuple[np.ndarray, np.ndarray]
+        ],
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Get pulse and gap durations of a realization.
+
+        Input:
+            repeat_idx:
+                Index of the realization.
+            simulate_durations:
+                Function which simulates pulse and gap durations using
+                the given RNG. Called only if the realization is not
+                in the store yet.
+
+        Output:
+            Memory-mapped pulse and gap durations.
+        """
+        pulse_path = self.__get_file(repeat_idx, "pulses")
+        gap_path = self.__get_file(repeat_idx, "gaps")
+        if not (os.path.exists(pulse_path) and os.path.exists(gap_path)):
+            pulse_durations, gap_durations = simulate_durations(
+                get_repeat_rng(self.seed, repeat_idx)
+            )
+            np.save(gap_path, gap_durations)
+            np.save(pulse_path, pulse_durations)
+        return np.load(pulse_path, mmap_mode="r"), np.load(gap_path, mmap_mode="r")
+
+    def get_fourier(
+        self,
+        repeat_idx: int,
+        freqs: np.ndarray,
+        simulate_durations: Callable[
+            [np.random.Generator], tuple[np.ndarray, np.ndarray]
+        ],
+    ) -> np.ndarray:
+        """Get Fourier transform of a realization.
+
+        Input:
+            repeat_idx:
+                Index of the realization.
+            freqs:
+                Desired frequencies.
+            simulate_durations:
+                Function which simulates pulse and gap durations using
+                the given RNG (see `get_events`).
+
+        Output:
+            Fourier transform of the realization at the desired
+            frequencies (see `return_fourier` of `lib.psd.get_snorp_psd`).
+        """
+        fourier_path = self.__get_file(repeat_idx, "fourier")
+        stored_freqs = np.zeros(0)
+        stored_fourier = np.zeros(0, dtype=complex)
+        if os.path.exists(fourier_path):
+            stored = np.load(fourier_path)
+            stored_freqs = stored[0].real
+            stored_fourier = stored[1]
+
+        missing_freqs = np.unique(freqs[~np.isin(freqs, stored_freqs)])
+        if len(missing_freqs) > 0:
+            pulse_durations, gap_durations = self.get_events(
+                repeat_idx, simulate_durations
+            )
+            missing_fourier = get_snorp_psd(
+                missing_freqs,
+                pulse_durations,
+                gap_durations,
+                pulse_magnitude=self.pulse_magnitude,
+                method=self.method,
+                return_fourier=True,
+            )
+            stored_freqs = np.concatenate((stored_freqs, missing_freqs))
+            stored_fourier = np.concatenate((stored_fourier, missing_fourier))
+            np.save(fourier_path, np.vstack((stored_freqs, stored_fourier)))
+
+        order = np.argsort(stored_freqs)
+        positions = order[np.searchsorted(stored_freqs, freqs, sorter=order)]
+        return stored_fourier[positions]
+
+    def get_psd(
+        self,
+        repeat_idx: int,
+        freqs: np.ndarray,
+        simulate_durations: Callable[
+            [np.random.Generator], tuple[np.ndarray, np.ndarray]
+        ],
+    ) -> np.ndarray:
+        """Get PSD of a realization.
+
+        Input:
+            repeat_idx:
+                Index of the realization.
+            freqs:
+                Desired frequencies.
+            simulate_durations:
+                Function which simulates pulse and gap durations using
+                the given RNG (see `get_events`).
+
+        Output:
+            PSD of the realization at the desired frequencies.
+        """
+        fourier = self.get_fourier(repeat_idx, freqs, simulate_durations)
+        pulse_durations, gap_durations = self.get_events(repeat_idx, simulate_durations)
+        total_duration = np.sum(pulse_durations) + np.sum(gap_durations)
+        return 2 / total_duration * (np.real(fourier) ** 2 + np.imag(fourier) ** 2)
+
+    def __get_file(self, repeat_idx: int, kind: str) -> str:
+        """Get path of the file holding data of a realization.
+
+        Input:
+            repeat_idx:
+                Index of the realization.
+            kind:
+                Kind of the data ("pulses", "gaps" or "fourier").
+
+        Output:
+            Path of the `.npy` file.
+        """
+        return os.path.join(self.path, f"repeat{repeat_idx:d}.{kind}.npy")
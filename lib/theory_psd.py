@@ -42,6 +42,41 @@ def get_poiss_poiss_psd(
     return const_term / ((gamma_theta + gamma_tau) ** 2 + angular_freqs**2)
 
 
+def get_high_freq_tail_psd(
+    freqs: np.ndarray,
+    pulse_magnitude: float,
+    mean_pulse: float,
+    mean_gap: float,
+) -> np.ndarray:
+    """Calculate high frequency asymptote of PSD for any pulses and gaps.
+
+    Input:
+        freqs:
+            Desired frequencies.
+        pulse_magnitude:
+            Fixed magnitude of the pulses in the signal.
+        mean_pulse:
+            Average pulse duration.
+        mean_gap:
+            Average gap duration.
+
+    Output:
+        A theoretical estimate of PSD values at the desired
+        frequencies.
+
+    Note: At frequencies high enough for the phases accumulated over
+        single pulses and gaps to be effectively random, only the
+        transitions themselves contribute, each pulse adding two jumps
+        of `pulse_magnitude`. Hence the `1/f^2` tail depends on the
+        distributions of pulse and gap durations only via their means.
+    """
+    angular_freqs = 2 * np.pi * freqs
+
+    nu_bar = 1 / (mean_pulse + mean_gap)
+
+    return 4 * (pulse_magnitude**2) * nu_bar / (angular_freqs**2)
+
+
 def get_long_poiss_bounded_pareto_psd(
     freqs: np.ndarray,
     pulse_magnitude: float,
@@ -1,14 +1,77 @@
+import copy
+from functools import partial
+from typing import Iterator
+
 import numpy as np
 import typer
 
+from lib.freq_grid import get_adaptive_freqs
 from lib.pareto_dist_bounded import sample
-from lib.psd import get_snorp_psd
+from lib.psd import get_snorp_psd, get_snorp_psd_streaming
+from lib.repeats import get_mean_psd, get_mean_psd_to_error
 from lib.theory_psd import (
     get_long_poiss_bounded_pareto_psd,
     get_short_poiss_bounded_pareto_psd,
 )
 
 
+def simulate_psd(
+    freqs: np.ndarray,
+    n_events: int,
+    pulse_magnitude: float,
+    mean_pulse: float,
+    min_gap: float,
+    max_gap: float,
+    power_gap: float,
+    chunk_size: int,
+    rng: np.random.Generator,
+) -> np.ndarray:
+    # sample distributions
+    sample_pulse = rng.exponential
+
+    def sample_gap(
+        power: float, low: float = 1, high: float = 1000, size: int = 1
+    ) -> np.ndarray:
+        return sample(power, low=low, high=high, size=size, rng=rng)
+
+    # generate and process the signal chunk by chunk to limit memory usage
+    if chunk_size > 0:
+        # without chunking all pulses are drawn before the gaps, so the gaps
+        # are drawn from a copy of the RNG advanced past all the pulses (which
+        # are discarded chunk by chunk), then the realization does not depend
+        # on the chunk size
+        gap_rng = copy.deepcopy(rng)
+        for chunk_from in range(0, n_events, chunk_size):
+            gap_rng.exponential(
+                scale=mean_pulse, size=min(chunk_size, n_events - chunk_from)
+            )
+
+        def generate_chunks() -> Iterator[tuple[np.ndarray, np.ndarray]]:
+            for chunk_from in range(0, n_events, chunk_size):
+                size = min(chunk_size, n_events - chunk_from)
+                gaps = sample(
+                    power_gap, low=min_gap, high=max_gap, size=size, rng=gap_rng
+                )
+                yield sample_pulse(scale=mean_pulse, size=size), np.atleast_1d(gaps)
+            # leave the RNG where the unchunked generation leaves it, as the
+            # legacy RNG stream is shared by the subsequent repeats
+            rng.bit_generator.state = gap_rng.bit_generator.state
+
+        return get_snorp_psd_streaming(
+            freqs, generate_chunks(), pulse_magnitude=pulse_magnitude
+        )
+
+    # main
+    pulse_duration = sample_pulse(scale=mean_pulse, size=n_events)
+    gap_duration = sample_gap(power_gap, low=min_gap, high=max_gap, size=n_events)
+    return get_snorp_psd(
+        freqs,
+        pulse_duration,
+        gap_duration,
+        pulse_magnitude=pulse_magnitude,
+    )
+
+
 def main(
     repeats: int = 1,
     n_events: int = 10000,
@@ -22,6 +85,12 @@ def main(
     n_freq: int = 100,
     archive_dir: str = "data",
     seed: int = -1,
+    workers: int = 1,
+    legacy_rng: bool = False,
+    chunk_size: int = -1,
+    adaptive: bool = False,
+    target_rel_error: float = -1,
+    max_repeats: int = 1000,
 ) -> None:
     """Simulate rectangular SNORP with Poissonian pulses and bounded Pareto gaps.
 
@@ -61,6 +130,37 @@ def main(
             RNG seed. If negative value is passed (which is the
             default), then seed will be randomly generated by
             `np.random.randint(0, int(2**20))`
+        workers: (default: 1)
+            Number of worker processes among which the repeats
+            are distributed. Result does not depend on the number
+            of workers.
+        legacy_rng: (default: False)
+            Draw all repeats sequentially from a single RNG
+            stream. Reproduces results archived before each
+            repeat got its own RNG stream. Requires a single
+            worker.
+        chunk_size: (default: -1)
+            If positive value is passed, then each realization is
+            generated and processed in chunks of this many events,
+            so that the whole realization is never held in memory.
+            Realization (for the same seed) does not depend on
+            the chunk size.
+        adaptive: (default: False)
+            If True, then instead of the evenly log-spaced grid,
+            a coarse grid is refined where the slope of the PSD
+            changes or where it deviates from the theoretical
+            one. In this case `n_freq` is the maximum number of
+            frequencies (see `lib.freq_grid.get_adaptive_freqs`).
+        target_rel_error: (default: -1)
+            If positive value is passed, then `repeats` is the
+            minimum number of repeats, and repeats are added
+            until the relative half-width of the 95% confidence
+            interval of the PSD falls below this value at every
+            frequency (see `lib.repeats.get_mean_psd_to_error`).
+            Achieved error is saved as an additional column.
+        max_repeats: (default: 1000)
+            Maximum number of repeats if `target_rel_error` is
+            positive.
 
     Output:
         Function returns nothing, but saves one file, which
@@ -72,17 +172,6 @@ def main(
         np.random.seed()
         seed = np.random.randint(0, int(2**20))
 
-    # RNG setup
-    rng = np.random.default_rng(seed)
-
-    # sample distributions
-    sample_pulse = rng.exponential
-
-    def sample_gap(
-        power: float, low: float = 1, high: float = 1000, size: int = 1
-    ) -> np.ndarray:
-        return sample(power, low=low, high=high, size=size, rng=rng)
-
     # simulation archival setup
     model_info = f"poiss{mean_pulse*10000:.0f}.pareto{power_gap*100:.0f}_{min_gap*1000:.0f}_{max_gap:.0f}"
     simulation_filename = f"{model_info}.seed{seed:d}"
@@ -93,46 +182,74 @@ def main(
         max_freq = (1 / max_gap) * 0.1 / (2 * np.pi)
     if min_freq < 0:
         min_freq = (1 / min_gap) * 10 / (2 * np.pi)
-    freqs = np.logspace(np.log10(min_freq), np.log10(max_freq), n_freq)
-
-    # main simulation loop
-    sim_psds = np.zeros((repeats, n_freq))
-    for sim_idx in range(repeats):
-        pulse_duration = sample_pulse(scale=mean_pulse, size=n_events)
-        gap_duration = sample_gap(power_gap, low=min_gap, high=max_gap, size=n_events)
-        sim_psds[sim_idx, :] = get_snorp_psd(
-            freqs,
-            pulse_duration,
-            gap_duration,
-            pulse_magnitude=pulse_magnitude,
-        )
 
     # numerical PSD
-    sim_psd = np.mean(sim_psds, axis=0)
+    sim_errors: dict[float, float] = {}
 
-    # theoretical PSD
-    if mean_pulse < min_gap:
-        theory_psd = get_short_poiss_bounded_pareto_psd(
+    def get_sim_psd(freqs: np.ndarray) -> np.ndarray:
+        simulate = partial(
+            simulate_psd,
             freqs,
+            n_events,
             pulse_magnitude,
             mean_pulse,
             min_gap,
             max_gap,
             power_gap,
+            chunk_size,
         )
-    else:
-        theory_psd = get_long_poiss_bounded_pareto_psd(
-            freqs,
-            pulse_magnitude,
-            mean_pulse,
-            min_gap,
-            max_gap,
-            power_gap,
+        if target_rel_error <= 0:
+            return get_mean_psd(
+                simulate, repeats, seed, workers=workers, legacy_rng=legacy_rng
+            )
+        sim_psd, rel_error, _ = get_mean_psd_to_error(
+            simulate,
+            target_rel_error,
+            repeats,
+            max_repeats,
+            seed,
+            workers=workers,
+            legacy_rng=legacy_rng,
         )
+        sim_errors.update(zip(freqs, rel_error))
+        return sim_psd
+
+    # theoretical PSD
+    def get_theory_psd(freqs: np.ndarray) -> np.ndarray:
+        if mean_pulse < min_gap:
+            return get_short_poiss_bounded_pareto_psd(
+                freqs,
+                pulse_magnitude,
+                mean_pulse,
+                min_gap,
+                max_gap,
+                power_gap,
+            )
+        else:
+            return get_long_poiss_bounded_pareto_psd(
+                freqs,
+                pulse_magnitude,
+                mean_pulse,
+                min_gap,
+                max_gap,
+                power_gap,
+            )
+
+    if adaptive:
+        freqs, sim_psd = get_adaptive_freqs(
+            get_sim_psd, min_freq, max_freq, n_freq, get_theory_psd=get_theory_psd
+        )
+    else:
+        freqs = np.logspace(np.log10(min_freq), np.log10(max_freq), n_freq)
+        sim_psd = get_sim_psd(freqs)
+    theory_psd = get_theory_psd(freqs)
 
+    output = [freqs, sim_psd, theory_psd]
+    if target_rel_error > 0:
+        output += [np.array([sim_errors[freq] for freq in freqs])]
     np.savetxt(
         psd_path,
-        np.log10(np.vstack((freqs, sim_psd, theory_psd)).T),
+        np.log10(np.vstack(output).T),
         delimiter=",",
         fmt="%.4f",
     )
@@ -1,13 +1,21 @@
+from functools import partial
+
 import numpy as np
 import typer
 
 from lib.pareto_dist_bounded import sample
-from lib.psd import get_snorp_psd
+from lib.psd import get_snorp_psd, stack_durations
+from lib.repeats import get_mean_psd, get_mean_psd_to_error
+from lib.store import RealizationStore
 from lib.theory_psd import (
     get_long_poiss_bounded_pareto_psd,
     get_short_poiss_bounded_pareto_psd,
 )
 
+# number of events drawn in the first block, before anything is known about
+# the typical cycle length
+PILOT_BLOCK_SIZE = 1024
+
 
 def simulate_duration(
     T: float,
@@ -17,6 +25,7 @@ def simulate_duration(
     max_gap: float,
     power_gap: float,
     rng: np.random._generator.Generator,
+    legacy_rng: bool = False,
 ) -> tuple[np.ndarray, np.ndarray]:
     # sample distributions
     sample_pulse = rng.exponential
@@ -26,24 +35,119 @@ def simulate_duration(
     ) -> np.ndarray:
         return sample(power, low=low, high=high, size=size, rng=rng)
 
+    # event by event generation consumes the RNG stream in the legacy order
+    if legacy_rng:
+        t_pulse = 0.0
+        t_gap = 0.0
+        pulse_duration = []
+        gap_duration = []
+        while t_pulse + t_gap < T:
+            gap = float(sample_gap(power_gap, low=min_gap, high=max_gap))
+            pulse = sample_pulse(mean_pulse)
+            if t_gap + t_pulse + gap > T:
+                gap = T - t_pulse - t_gap
+                pulse = 0
+            t_gap = t_gap + gap
+            if pulse > 0 and t_gap + t_pulse + pulse > T:
+                pulse = T - t_pulse - t_gap
+            t_pulse = t_pulse + pulse
+            pulse_duration += [pulse]
+            gap_duration += [gap]
+        return np.array(pulse_duration), np.array(gap_duration)
+
     # main
-    t_pulse = 0.0
-    t_gap = 0.0
-    pulse_duration = []
-    gap_duration = []
-    while t_pulse + t_gap < T:
-        gap = float(sample_gap(power_gap, low=min_gap, high=max_gap))
-        pulse = sample_pulse(mean_pulse)
-        if t_gap + t_pulse + gap > T:
-            gap = T - t_pulse - t_gap
-            pulse = 0
-        t_gap = t_gap + gap
-        if pulse > 0 and t_gap + t_pulse + pulse > T:
-            pulse = T - t_pulse - t_gap
-        t_pulse = t_pulse + pulse
-        pulse_duration += [pulse]
-        gap_duration += [gap]
-    return np.array(pulse_duration), np.array(gap_duration)
+    t_end = 0.0
+    block_size = PILOT_BLOCK_SIZE
+    pulse_blocks = []
+    gap_blocks = []
+    while True:
+        gaps = sample_gap(power_gap, low=min_gap, high=max_gap, size=block_size)
+        pulses = sample_pulse(mean_pulse, size=block_size)
+        cycle_ends = t_end + np.cumsum(gaps + pulses)
+        last = int(np.searchsorted(cycle_ends, T, side="left"))
+        if last == block_size:
+            # not there yet, size the next block from the observed cycle length
+            pulse_blocks += [pulses]
+            gap_blocks += [gaps]
+            mean_cycle = (cycle_ends[-1] - t_end) / block_size
+            t_end = cycle_ends[-1]
+            block_size = int(np.ceil(1.1 * (T - t_end) / mean_cycle)) + 64
+            continue
+        # truncate the last gap (dropping the pulse) or the last pulse
+        gap_start = cycle_ends[last - 1] if last > 0 else t_end
+        if gap_start + gaps[last] >= T:
+            gaps[last] = T - gap_start
+            pulses[last] = 0
+        else:
+            pulses[last] = T - gap_start - gaps[last]
+        pulse_blocks += [pulses[: last + 1]]
+        gap_blocks += [gaps[: last + 1]]
+        return np.concatenate(pulse_blocks), np.concatenate(gap_blocks)
+
+
+def simulate_psd(
+    freqs: np.ndarray,
+    T: float,
+    pulse_magnitude: float,
+    mean_pulse: float,
+    min_gap: float,
+    max_gap: float,
+    power_gap: float,
+    legacy_rng: bool,
+    method: str,
+    rng: np.random.Generator,
+) -> np.ndarray:
+    pulse_duration, gap_duration = simulate_duration(
+        T,
+        pulse_magnitude,
+        mean_pulse,
+        min_gap,
+        max_gap,
+        power_gap,
+        rng,
+        legacy_rng=legacy_rng,
+    )
+    return get_snorp_psd(
+        freqs,
+        pulse_duration,
+        gap_duration,
+        pulse_magnitude=pulse_magnitude,
+        method=method,
+    )
+
+
+def simulate_psd_batch(
+    freqs: np.ndarray,
+    T: float,
+    pulse_magnitude: float,
+    mean_pulse: float,
+    min_gap: float,
+    max_gap: float,
+    power_gap: float,
+    legacy_rng: bool,
+    method: str,
+    rngs: list[np.random.Generator],
+) -> np.ndarray:
+    durations = [
+        simulate_duration(
+            T,
+            pulse_magnitude,
+            mean_pulse,
+            min_gap,
+            max_gap,
+            power_gap,
+            rng,
+            legacy_rng=legacy_rng,
+        )
+        for rng in rngs
+    ]
+    return get_snorp_psd(
+        freqs,
+        stack_durations([pulse_duration for pulse_duration, _ in durations]),
+        stack_durations([gap_duration for _, gap_duration in durations]),
+        pulse_magnitude=pulse_magnitude,
+        method=method,
+    )
 
 
 def main(
@@ -59,6 +163,13 @@ def main(
     n_freq: int = 100,
     archive_dir: str = "data",
     seed: int = -1,
+    workers: int = 1,
+    legacy_rng: bool = False,
+    method: str = "direct",
+    target_rel_error: float = -1,
+    max_repeats: int = 1000,
+    batch: bool = False,
+    store_dir: str = "",
 ) -> None:
     """Simulate rectangular SNORP with Poissonian pulses and bounded Pareto gaps.
 
@@ -99,6 +210,46 @@ def main(
             RNG seed. If negative value is passed (which is the
             default), then seed will be randomly generated by
             `np.random.randint(0, int(2**20))`
+        workers: (default: 1)
+            Number of worker processes among which the repeats
+            are distributed. Result does not depend on the number
+            of workers.
+        legacy_rng: (default: False)
+            Draw all repeats sequentially from a single RNG
+            stream. Reproduces results archived before each
+            repeat got its own RNG stream. Requires a single
+            worker.
+        method: (default: "direct")
+            Method used to calculate the PSD, see
+            `lib.psd.get_snorp_psd`. As only the natural
+            frequencies are considered, "natural" method is
+            the fastest one.
+        target_rel_error: (default: -1)
+            If positive value is passed, then `repeats` is the
+            minimum number of repeats, and repeats are added
+            until the relative half-width of the 95% confidence
+            interval of the PSD falls below this value at every
+            frequency (see `lib.repeats.get_mean_psd_to_error`).
+            Achieved error is saved as an additional column.
+        max_repeats: (default: 1000)
+            Maximum number of repeats if `target_rel_error` is
+            positive.
+        batch: (default: False)
+            If True, then the repeats handled by a single worker
+            are evaluated as a batch in a single call to
+            `lib.psd.get_snorp_psd`. Reduces per-call overhead
+            when each repeat contains only a few events. Not
+            used together with `target_rel_error`.
+        store_dir: (default: "")
+            If non-empty, then the durations and the Fourier
+            transforms of each repeat are kept in this folder
+            (see `lib.store.RealizationStore`). Rerunning with
+            the same model, duration, method and seed evaluates
+            only the frequencies which are not in the store yet,
+            a store created with different settings is not
+            reused. Repeats are evaluated in the main process,
+            `workers`, `target_rel_error` and `batch` are not
+            used.
 
     Output:
         Function returns nothing, but saves one file, which
@@ -110,9 +261,6 @@ def main(
         np.random.seed()
         seed = np.random.randint(0, int(2**20))
 
-    # RNG setup
-    rng = np.random.default_rng(seed)
-
     # simulation archival setup
     model_info = f"poiss{mean_pulse*10000:.0f}.pareto{power_gap*100:.0f}_{min_gap*1000:.0f}_{max_gap:.0f}"
     simulation_filename = f"{model_info}.seed{seed:d}"
@@ -131,29 +279,78 @@ def main(
         min_freq = (1 / min_gap) * 10 / (2 * np.pi)
     freqs = np.logspace(np.log10(min_freq), np.log10(max_freq), n_freq)
     freqs = np.unique(np.round(duration * freqs)) / duration  # only natural freqs
-    n_freq = len(freqs)
 
-    # main simulation loop
-    sim_psds = np.zeros((repeats, n_freq))
-    for sim_idx in range(repeats):
-        pulse_duration, gap_duration = simulate_duration(
+    # numerical PSD
+    simulate = partial(
+        simulate_psd,
+        freqs,
+        duration,
+        pulse_magnitude,
+        mean_pulse,
+        min_gap,
+        max_gap,
+        power_gap,
+        legacy_rng,
+        method,
+    )
+    if store_dir:
+        if legacy_rng:
+            raise ValueError("Store requires separate RNG streams for repeats.")
+        # model info does not include the duration and is rounded, so the
+        # exact parameters are also checked against the store metadata
+        store = RealizationStore(
+            store_dir,
+            f"{model_info}.duration{duration:.0f}",
+            seed,
+            pulse_magnitude=pulse_magnitude,
+            method=method,
+            parameters={
+                "duration": duration,
+                "mean_pulse": mean_pulse,
+                "min_gap": min_gap,
+                "max_gap": max_gap,
+                "power_gap": power_gap,
+            },
+        )
+        simulate_repeat = partial(
+            simulate_duration,
             duration,
             pulse_magnitude,
             mean_pulse,
             min_gap,
             max_gap,
             power_gap,
-            rng,
         )
-        sim_psds[sim_idx, :] = get_snorp_psd(
-            freqs,
-            pulse_duration,
-            gap_duration,
-            pulse_magnitude=pulse_magnitude,
+        sim_psd = np.mean(
+            [
+                store.get_psd(repeat_idx, freqs, simulate_repeat)
+                for repeat_idx in range(repeats)
+            ],
+            axis=0,
+        )
+    elif target_rel_error <= 0 and batch:
+        sim_psd = get_mean_psd(
+            partial(simulate_psd_batch, *simulate.args),
+            repeats,
+            seed,
+            workers=workers,
+            legacy_rng=legacy_rng,
+            batched=True,
+        )
+    elif target_rel_error <= 0:
+        sim_psd = get_mean_psd(
+            simulate, repeats, seed, workers=workers, legacy_rng=legacy_rng
+        )
+    else:
+        sim_psd, rel_error, _ = get_mean_psd_to_error(
+            simulate,
+            target_rel_error,
+            repeats,
+            max_repeats,
+            seed,
+            workers=workers,
+            legacy_rng=legacy_rng,
         )
-
-    # numerical PSD
-    sim_psd = np.mean(sim_psds, axis=0)
 
     # theoretical PSD
     if mean_pulse < min_gap:
@@ -175,9 +372,12 @@ def main(
             power_gap,
         )
 
+    output = [freqs, sim_psd, theory_psd]
+    if target_rel_error > 0:
+        output += [rel_error]
     np.savetxt(
         psd_path,
-        np.log10(np.vstack((freqs, sim_psd, theory_psd)).T),
+        np.log10(np.vstack(output).T),
         delimiter=",",
         fmt="%.4f",
     )
@@ -1,10 +1,37 @@
+from functools import partial
+
 import numpy as np
 import typer
 
+from lib.freq_grid import get_adaptive_freqs
 from lib.psd import get_snorp_psd
+from lib.repeats import get_mean_psd, get_mean_psd_to_error
 from lib.theory_psd import get_poiss_poiss_psd
 
 
+def simulate_psd(
+    freqs: np.ndarray,
+    n_events: int,
+    pulse_magnitude: float,
+    mean_pulse: float,
+    mean_gap: float,
+    rng: np.random.Generator,
+) -> np.ndarray:
+    # sample distributions
+    sample_pulse = rng.exponential
+    sample_gap = rng.exponential
+
+    # main
+    pulse_duration = sample_pulse(scale=mean_pulse, size=n_events)
+    gap_duration = sample_gap(scale=mean_gap, size=n_events)
+    return get_snorp_psd(
+        freqs,
+        pulse_duration,
+        gap_duration,
+        pulse_magnitude=pulse_magnitude,
+    )
+
+
 def main(
     repeats: int = 1,
     n_events: int = 10000,
@@ -16,6 +43,11 @@ def main(
     n_freq: int = 100,
     archive_dir: str = "data",
     seed: int = -1,
+    workers: int = 1,
+    legacy_rng: bool = False,
+    adaptive: bool = False,
+    target_rel_error: float = -1,
+    max_repeats: int = 1000,
 ) -> None:
     """Simulate rectangular SNORP with Poissonian durations.
 
@@ -51,6 +83,31 @@ def main(
             RNG seed. If negative value is passed (which is the
             default), then seed will be randomly generated by
             `np.random.randint(0, int(2**20))`
+        workers: (default: 1)
+            Number of worker processes among which the repeats
+            are distributed. Result does not depend on the number
+            of workers.
+        legacy_rng: (default: False)
+            Draw all repeats sequentially from a single RNG
+            stream. Reproduces results archived before each
+            repeat got its own RNG stream. Requires a single
+            worker.
+        adaptive: (default: False)
+            If True, then instead of the evenly log-spaced grid,
+            a coarse grid is refined where the slope of the PSD
+            changes or where it deviates from the theoretical
+            one. In this case `n_freq` is the maximum number of
+            frequencies (see `lib.freq_grid.get_adaptive_freqs`).
+        target_rel_error: (default: -1)
+            If positive value is passed, then `repeats` is the
+            minimum number of repeats, and repeats are added
+            until the relative half-width of the 95% confidence
+            interval of the PSD falls below this value at every
+            frequency (see `lib.repeats.get_mean_psd_to_error`).
+            Achieved error is saved as an additional column.
+        max_repeats: (default: 1000)
+            Maximum number of repeats if `target_rel_error` is
+            positive.
 
     Output:
         Function returns nothing, but saves one file, which
@@ -62,13 +119,6 @@ def main(
         np.random.seed()
         seed = np.random.randint(0, int(2**20))
 
-    # RNG setup
-    rng = np.random.default_rng(seed)
-
-    # sample distributions
-    sample_pulse = rng.exponential
-    sample_gap = rng.exponential
-
     # simulation archival setup
     model_info = f"poiss{mean_pulse*10:.0f}.poiss{mean_gap*10:.0f}"
     simulation_filename = f"{model_info}.seed{seed:d}"
@@ -79,29 +129,49 @@ def main(
         min_freq = 1 / (n_events * (mean_gap + mean_pulse))
     if max_freq < 0:
         max_freq = 2 * n_events / np.min([mean_gap, mean_pulse])
-    freqs = np.logspace(np.log10(min_freq), np.log10(max_freq), n_freq)
-
-    # main simulation loop
-    sim_psds = np.zeros((repeats, n_freq))
-    for sim_idx in range(repeats):
-        pulse_duration = sample_pulse(scale=mean_pulse, size=n_events)
-        gap_duration = sample_gap(scale=mean_gap, size=n_events)
-        sim_psds[sim_idx, :] = get_snorp_psd(
-            freqs,
-            pulse_duration,
-            gap_duration,
-            pulse_magnitude=pulse_magnitude,
-        )
 
     # numerical PSD
-    sim_psd = np.mean(sim_psds, axis=0)
+    sim_errors: dict[float, float] = {}
+
+    def get_sim_psd(freqs: np.ndarray) -> np.ndarray:
+        simulate = partial(
+            simulate_psd, freqs, n_events, pulse_magnitude, mean_pulse, mean_gap
+        )
+        if target_rel_error <= 0:
+            return get_mean_psd(
+                simulate, repeats, seed, workers=workers, legacy_rng=legacy_rng
+            )
+        sim_psd, rel_error, _ = get_mean_psd_to_error(
+            simulate,
+            target_rel_error,
+            repeats,
+            max_repeats,
+            seed,
+            workers=workers,
+            legacy_rng=legacy_rng,
+        )
+        sim_errors.update(zip(freqs, rel_error))
+        return sim_psd
 
     # theoretical PSD
-    theory_psd = get_poiss_poiss_psd(freqs, pulse_magnitude, mean_pulse, mean_gap)
+    def get_theory_psd(freqs: np.ndarray) -> np.ndarray:
+        return get_poiss_poiss_psd(freqs, pulse_magnitude, mean_pulse, mean_gap)
+
+    if adaptive:
+        freqs, sim_psd = get_adaptive_freqs(
+            get_sim_psd, min_freq, max_freq, n_freq, get_theory_psd=get_theory_psd
+        )
+    else:
+        freqs = np.logspace(np.log10(min_freq), np.log10(max_freq), n_freq)
+        sim_psd = get_sim_psd(freqs)
+    theory_psd = get_theory_psd(freqs)
 
+    output = [freqs, sim_psd, theory_psd]
+    if target_rel_error > 0:
+        output += [np.array([sim_errors[freq] for freq in freqs])]
     np.savetxt(
         psd_path,
-        np.log10(np.vstack((freqs, sim_psd, theory_psd)).T),
+        np.log10(np.vstack(output).T),
         delimiter=",",
         fmt="%.4f",
     )